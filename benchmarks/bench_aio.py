@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from new_markdown.aio import AsyncMarkdown
+
+SMALL = """## Title
+Some paragraph text with *emphasis* and a [link](example.com).
+
+- item one
+- item two
+"""
+
+LARGE = SMALL * 40000
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def small_latencies(amd, count):
+    latencies = []
+    for _ in range(count):
+        begin = time.perf_counter()
+        await amd.convert(SMALL)
+        latencies.append(time.perf_counter() - begin)
+        await asyncio.sleep(0.001)
+    return latencies
+
+
+async def main():
+    async with AsyncMarkdown() as amd:
+        idle = await small_latencies(amd, 200)
+
+        begin = time.perf_counter()
+        large = asyncio.ensure_future(amd.convert(LARGE))
+        busy = await small_latencies(amd, 200)
+        await large
+        large_seconds = time.perf_counter() - begin
+
+    print(f'large document: {len(LARGE) / 1e6:.1f} MB '
+          f'in {large_seconds:.2f}s')
+    print(f'{"small docs":>12}{"p50 ms":>10}{"p99 ms":>10}')
+    for name, values in (('idle', idle), ('busy', busy)):
+        print(f'{name:>12}{percentile(values, 0.5) * 1e3:>10.2f}'
+              f'{percentile(values, 0.99) * 1e3:>10.2f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
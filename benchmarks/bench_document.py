@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import timeit
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import CASES, generate
+from new_markdown import Markdown
+from new_markdown.document import Document
+
+def best(func):
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+if __name__ == '__main__':
+    md = Markdown(recording_headers=True, header_ids='slug')
+    # Tables render their body lazily, so the comparison is source to HTML
+    # against bytes to HTML.
+    print(f'{"case":<16}{"KB":>6}{"parse ms":>10}{"load ms":>10}'
+          f'{"convert ms":>12}{"from bytes ms":>15}{"speedup":>9}'
+          f'{"bytes/src":>11}')
+    for case in CASES:
+        kb = 256
+        text = generate(case, kb << 10)
+        doc = md.parse(text)
+        data = doc.to_bytes()
+        assert Document.from_bytes(data).render(True) == doc.render(True)
+
+        t_parse = best(lambda: md.parse(text))
+        t_load = best(lambda: Document.from_bytes(data))
+        t_convert = best(lambda: md.parse(text).render())
+        t_bytes = best(lambda: Document.from_bytes(data).render())
+        print(f'{case:<16}{kb:>6}{t_parse * 1e3:>10.1f}{t_load * 1e3:>10.1f}'
+              f'{t_convert * 1e3:>12.1f}{t_bytes * 1e3:>15.1f}'
+              f'{t_convert / t_bytes:>9.1f}'
+              f'{len(data) / len(text.encode()):>11.2f}')
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import timeit
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import generate
+from new_markdown.core import Markdown, default_extensions
+
+
+def unused_block(md, lines, start, kinds, ctx):
+    raise AssertionError('never triggered')
+
+
+def unused_stage(md, line, lo, hi, out, nxt):
+    raise AssertionError('never triggered')
+
+
+def registry(count):
+    # `count` block and inline extensions on characters the corpus never
+    # uses, so only the cost of dispatching past them is measured.
+    registry = default_extensions()
+    for i in range(count):
+        registry.add_block(f'block{i}', chr(0x2600 + i), unused_block)
+        registry.add_inline(f'inline{i}', chr(0x2800 + i), unused_stage,
+                            priority=i)
+    return registry
+
+
+def bench(md, text, number=3):
+    return min(timeit.repeat(lambda: md.convert(text), number=number,
+                             repeat=3)) / number
+
+
+if __name__ == '__main__':
+    text = generate('mixed', 1 << 20)
+    mb = len(text.encode('utf-8')) / (1 << 20)
+    print(f'{"registry":<22}{"ms":>10}{"MB/s":>10}')
+    for count in (0, 8, 32, 128):
+        seconds = bench(Markdown(extensions=registry(count)), text)
+        print(f'{f"+{count} extensions":<22}{seconds * 1e3:>10.1f}'
+              f'{mb / seconds:>10.2f}')
+
+    for names in (('table', ), ('table', 'math')):
+        removed = default_extensions()
+        removed.remove(*names)
+        seconds = bench(Markdown(extensions=removed), text)
+        print(f'{"-" + ",".join(names):<22}{seconds * 1e3:>10.1f}'
+              f'{mb / seconds:>10.2f}')
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import timeit
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from new_markdown import Markdown
+
+MARKERS = {
+    'em': '*word* ',
+    'strong': '**word** ',
+    'strong_em': '***word*** ',
+    'unbalanced': '*word ',
+    'code': '`word` ',
+    'link': '[word](example.com) ',
+    'img': '![word](example.png) ',
+    'formula': '$x_1 * y$ ',
+    'unbalanced_formula': '$x ',
+}
+
+
+def bench(md, line, number=5):
+    return min(timeit.repeat(lambda: md.code(line), number=number,
+                             repeat=3)) / number
+
+
+if __name__ == '__main__':
+    md = Markdown()
+    print(f'{"case":<12}{"markers":>10}{"ms/line":>12}{"us/marker":>12}')
+    for name, unit in MARKERS.items():
+        for count in (100, 400, 1600):
+            seconds = bench(md, unit * count)
+            print(f'{name:<12}{count:>10}{seconds * 1e3:>12.3f}'
+                  f'{seconds * 1e6 / count:>12.3f}')
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from new_markdown import Markdown
+from new_markdown.core import ALIGN_ATTRS
+from new_markdown.elements import Element, table, tbody, td, thead, tr
+
+
+class DictElement(object):
+    # The previous layout: an instance __dict__, a fresh attrs dict per
+    # element and every child list wrapped, even for a single string.
+
+    def __init__(self, tag_name='', attrs=None, children=None):
+        self.tag_name = tag_name
+        self.with_closing = True
+        self.attrs = attrs
+        if not isinstance(children, list):
+            children = [children]
+        self.children = children
+
+
+def dict_table(nrows, ncols):
+    return DictElement('table', {'class': 'table'}, [
+        DictElement('tbody', None, [
+            DictElement('tr', None, [
+                DictElement('td', {'style': 'text-align: center'},
+                            f'cell {i}-{j}') for j in range(ncols)
+            ]) for i in range(nrows)
+        ])
+    ])
+
+
+def slot_table(nrows, ncols):
+    return table(children=[
+        tbody(children=[
+            tr(children=[
+                td(children=f'cell {i}-{j}', attrs=ALIGN_ATTRS['center'])
+                for j in range(ncols)
+            ]) for i in range(nrows)
+        ])
+    ])
+
+
+def traced(func, *args):
+    tracemalloc.start()
+    result = func(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def markdown_table(nrows, ncols):
+    lines = ['| ' + ' | '.join(f'h{j}' for j in range(ncols)) + ' |',
+             '| ' + ' | '.join(':-:' for _ in range(ncols)) + ' |']
+    for i in range(nrows):
+        lines.append('| ' + ' | '.join(f'cell {i}-{j}'
+                                       for j in range(ncols)) + ' |')
+    return lines
+
+
+def markdown_tree(md, lines):
+    aligns = [
+        md.table_align(l.strip()) for l in lines[1].split('|')[1:-1]
+        if l and not l.isspace()
+    ]
+    return table(children=[
+        thead(children=md.handle_th_line(lines[0], aligns=aligns)),
+        tbody(children=[
+            md.handle_td_line(line, aligns=aligns) for line in lines[2:]
+        ])
+    ])
+
+
+if __name__ == '__main__':
+    ncols = 10
+    print(f'{"cells":>8}{"layout":>10}{"MB":>10}{"bytes/node":>12}')
+    for nrows in (1000, 10000):
+        nodes = nrows * (ncols + 1) + 2
+        for name, build in (('dict', dict_table), ('slots', slot_table)):
+            _, size = traced(build, nrows, ncols)
+            print(f'{nrows * ncols:>8}{name:>10}{size / 1e6:>10.1f}'
+                  f'{size / nodes:>12.0f}')
+
+    # Element trees built from Markdown's row and header handlers, source
+    # lines excluded. Markdown.table itself streams its rows instead of
+    # holding them (see bench_table.py), so it is not measured here.
+    md = Markdown()
+    lines = markdown_table(10000, ncols)
+    ele, size = traced(markdown_tree, md, lines)
+    assert isinstance(ele, Element)
+    print(f'{10000 * ncols:>8}{"markdown":>10}{size / 1e6:>10.1f}'
+          f'{size / (10001 * (ncols + 1) + 3):>12.0f}')
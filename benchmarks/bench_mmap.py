@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from corpus import generate
+
+# Each mode runs in a fresh interpreter, so ru_maxrss is its own peak.
+MODES = {
+    'read': """
+with open(src, encoding='utf-8') as fin:
+    html = md.convert(fin.read(), final=True)
+with open(dst, 'w', encoding='utf-8') as fout:
+    fout.write(html)
+""",
+    'iter': """
+with open(src, encoding='utf-8') as fin, \\
+        open(dst, 'w', encoding='utf-8') as fout:
+    fout.writelines(md.convert_iter(fin, final=True))
+""",
+    'mmap': """
+md.convert_file(src, dst, final=True)
+""",
+}
+
+CHILD = """
+import resource, sys
+sys.path.insert(0, {root!r})
+from new_markdown import Markdown
+md = Markdown()
+src, dst = {src!r}, {dst!r}
+{body}
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_input(path, size):
+    # 4 MB of generated text, repeated up to size.
+    chunk = generate('mixed', 4 << 20) + '\n\n'
+    data = chunk.encode('utf-8')
+    with open(path, 'wb') as fout:
+        written = 0
+        while written < size:
+            fout.write(data)
+            written += len(data)
+    return written
+
+
+def run(mode, src, dst):
+    code = CHILD.format(root=ROOT, src=src, dst=dst, body=MODES[mode])
+    begin = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', code],
+                          capture_output=True,
+                          text=True)
+    seconds = time.perf_counter() - begin
+    if proc.returncode:
+        return None, seconds
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    rss = int(proc.stdout.split()[-1])
+    return rss * (1 if sys.platform == 'darwin' else 1024), seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Peak RSS of converting one large file: read() into a '
+        'string, iterating the file object, or convert_file on a memory map.')
+    parser.add_argument('--size', type=int, default=2048, help='input MB')
+    parser.add_argument('--modes',
+                        nargs='+',
+                        choices=list(MODES),
+                        default=['iter', 'mmap'],
+                        help='`read` needs several times the input size')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = os.path.join(tmpdir, 'input.md')
+        size = write_input(src, args.size << 20)
+        print(f'input {size / 1e6:.0f} MB')
+        print(f'{"mode":<8}{"peak RSS MB":>14}{"seconds":>10}{"MB/s":>8}')
+        for mode in args.modes:
+            dst = os.path.join(tmpdir, f'{mode}.html')
+            rss, seconds = run(mode, src, dst)
+            peak = 'failed' if rss is None else f'{rss / 1e6:.1f}'
+            print(f'{mode:<8}{peak:>14}{seconds:>10.1f}'
+                  f'{size / 1e6 / seconds:>8.2f}')
+            if os.path.exists(dst):
+                os.unlink(dst)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import timeit
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from new_markdown import Markdown
+
+
+def flat_list(n):
+    return '\n'.join(f'- item *{i}*' for i in range(n))
+
+
+def deep_list(depth, width=1):
+    return '\n'.join(f'{"    " * level}- item {level}.{i}'
+                     for level in range(depth) for i in range(width))
+
+
+def sawtooth_list(n, depth):
+    return '\n'.join(f'{"    " * (i % depth)}1. item {i}' for i in range(n))
+
+
+def deep_quote(depth, width=1):
+    return '\n'.join(f'{"> " * level}quote {level}.{i}'
+                     for level in range(1, depth + 1) for i in range(width))
+
+
+CASES = [
+    ('flat list', flat_list, (2500, 10000)),
+    ('deep list', deep_list, (25, 100, 1000)),
+    ('sawtooth list', lambda n: sawtooth_list(n, 100), (2500, 10000)),
+    ('deep quote', deep_quote, (25, 100, 400)),
+]
+
+if __name__ == '__main__':
+    md = Markdown()
+    print(f'{"case":<16}{"n":>8}{"lines":>8}{"ms":>10}{"us/line":>10}')
+    for name, build, sizes in CASES:
+        for n in sizes:
+            text = build(n)
+            nlines = text.count('\n') + 1
+            seconds = min(timeit.repeat(lambda: md.convert(text), number=1,
+                                        repeat=3))
+            print(f'{name:<16}{n:>8}{nlines:>8}{seconds * 1e3:>10.1f}'
+                  f'{seconds * 1e6 / nlines:>10.1f}')
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import timeit
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import generate
+from new_markdown import Markdown
+
+if __name__ == '__main__':
+    md = Markdown(recording_headers=True, header_ids='slug')
+    print(f'{"case":<12}{"KB":>8}{"convert ms":>12}{"outline ms":>12}'
+          f'{"speedup":>10}')
+    for case in ('headers', 'mixed', 'tables', 'code_blocks'):
+        for kb in (64, 512):
+            text = generate(case, kb << 10)
+            t_convert = min(
+                timeit.repeat(lambda: md.convert(text, final=True),
+                              number=1,
+                              repeat=3))
+            t_outline = min(
+                timeit.repeat(lambda: md.outline(text), number=1, repeat=3))
+            print(f'{case:<12}{kb:>8}{t_convert * 1e3:>12.1f}'
+                  f'{t_outline * 1e3:>12.1f}{t_convert / t_outline:>10.1f}')
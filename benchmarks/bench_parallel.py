@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import generate
+from new_markdown import Markdown, parallel
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert one large file serially and on process pools '
+        'of several sizes.')
+    parser.add_argument('--size', type=int, default=64, help='input MB')
+    parser.add_argument('--workers',
+                        nargs='+',
+                        type=int,
+                        default=[2, 4, os.cpu_count()])
+    parser.add_argument('--chunk_size',
+                        type=int,
+                        default=parallel.PARALLEL_CHUNK >> 20,
+                        help='MB')
+    args = parser.parse_args()
+
+    md = Markdown(recording_headers=True, header_ids='slug')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = os.path.join(tmpdir, 'input.md')
+        data = (generate('mixed', 4 << 20) + '\n\n').encode('utf-8')
+        with open(src, 'wb') as fout:
+            for _ in range(-(-(args.size << 20) // len(data))):
+                fout.write(data)
+        size = os.path.getsize(src)
+
+        with open(src, 'rb') as fin:
+            view = memoryview(fin.read())
+        begin = time.perf_counter()
+        cuts = len(list(parallel.split_offsets(md, view,
+                                               args.chunk_size << 20)))
+        print(f'input {size / 1e6:.0f} MB, {cuts + 1} chunks, split scan '
+              f'{time.perf_counter() - begin:.2f}s, {os.cpu_count()} CPUs')
+
+        print(f'{"workers":<10}{"seconds":>10}{"MB/s":>8}{"speedup":>9}')
+        serial = os.path.join(tmpdir, 'serial.html')
+        begin = time.perf_counter()
+        md.convert_file(src, serial, final=True)
+        base = time.perf_counter() - begin
+        print(f'{"serial":<10}{base:>10.1f}{size / 1e6 / base:>8.2f}'
+              f'{1:>9.1f}')
+
+        out = os.path.join(tmpdir, 'parallel.html')
+        with open(serial, encoding='utf-8') as fin:
+            expected = fin.read()
+        for workers in args.workers:
+            begin = time.perf_counter()
+            parallel.convert_file(md,
+                                  src,
+                                  out,
+                                  final=True,
+                                  workers=workers,
+                                  chunk_size=args.chunk_size << 20)
+            seconds = time.perf_counter() - begin
+            with open(out, encoding='utf-8') as fin:
+                assert fin.read() == expected
+            print(f'{workers:<10}{seconds:>10.1f}{size / 1e6 / seconds:>8.2f}'
+                  f'{base / seconds:>9.1f}')
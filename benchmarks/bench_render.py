@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from new_markdown.elements import table, tbody, td, tr
+
+
+def build_table(nrows, ncols=4):
+    rows = [
+        tr(children=[
+            td(children=f'cell {i}-{j}',
+               attrs={'style': 'text-align: center'}) for j in range(ncols)
+        ]) for i in range(nrows)
+    ]
+    return table(children=[tbody(children=rows)])
+
+
+if __name__ == '__main__':
+    print(f'{"rows":>8}{"str() ms":>12}{"render() ms":>14}{"MB/s":>10}')
+    for nrows in (5000, 20000, 50000):
+        ele = build_table(nrows)
+        size = len(str(ele).encode()) / 1e6
+        t_str = min(timeit.repeat(lambda: str(ele), number=1, repeat=3))
+        t_render = min(
+            timeit.repeat(lambda: ele.render(io.StringIO()), number=1,
+                          repeat=3))
+        print(f'{nrows:>8}{t_str * 1e3:>12.1f}{t_render * 1e3:>14.1f}'
+              f'{size / t_str:>10.1f}')
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import timeit
+from html.parser import HTMLParser
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import generate
+from new_markdown import Markdown
+
+
+class Extractor(HTMLParser):
+    # The convert-then-parse approach: collect the same records from HTML.
+
+    def __init__(self):
+        super().__init__()
+        self.links, self.images, self.headings = [], [], []
+        self._heading = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'a':
+            self.links.append(attrs.get('href'))
+        elif tag == 'img':
+            self.images.append(attrs.get('src'))
+        elif tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            self._heading = []
+
+    def handle_data(self, data):
+        if self._heading is not None:
+            self._heading.append(data)
+
+    def handle_endtag(self, tag):
+        if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            self.headings.append(''.join(self._heading))
+            self._heading = None
+
+
+def convert_and_parse(md, text):
+    parser = Extractor()
+    parser.feed(md.convert(text))
+    parser.close()
+    return parser
+
+
+if __name__ == '__main__':
+    md = Markdown()
+    print(f'{"case":<12}{"KB":>8}{"convert+parse ms":>18}{"scan ms":>10}'
+          f'{"speedup":>10}{"links":>8}{"images":>8}')
+    for case in ('mixed', 'paragraphs', 'images', 'tables', 'headers'):
+        for kb in (64, 512):
+            text = generate(case, kb << 10)
+            meta = md.scan(text)
+            parsed = convert_and_parse(md, text)
+            assert [link.href for link in meta.links] == parsed.links
+            assert [image.src for image in meta.images] == parsed.images
+            assert [h.text for h in meta.headings] == parsed.headings
+
+            t_parse = min(
+                timeit.repeat(lambda: convert_and_parse(md, text),
+                              number=1,
+                              repeat=3))
+            t_scan = min(timeit.repeat(lambda: md.scan(text), number=1,
+                                       repeat=3))
+            print(f'{case:<12}{kb:>8}{t_parse * 1e3:>18.1f}'
+                  f'{t_scan * 1e3:>10.1f}{t_parse / t_scan:>10.1f}'
+                  f'{len(meta.links):>8}{len(meta.images):>8}')
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.request import Request, urlopen
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from corpus import generate
+from new_markdown.server import RenderServer
+
+if __name__ == '__main__':
+    # Latency of one small conversion: a fresh md2html process, and a
+    # request to a running server, for a new document and a repeated one.
+    server = RenderServer(('127.0.0.1', 0), workers=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    def post(text):
+        data = json.dumps({'text': text}).encode()
+        with urlopen(Request(f'{url}/render', data=data)) as resp:
+            return resp.read()
+
+    script = os.path.join(ROOT, 'scripts', 'md2html')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    print(f'{"KB":>6}{"md2html ms":>12}{"miss ms":>10}{"hit ms":>10}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = os.path.join(tmpdir, 'doc.md')
+        dst = os.path.join(tmpdir, 'doc.html')
+        for kb in (1, 16, 128):
+            text = generate('mixed', kb << 10)
+            with open(src, 'w') as fout:
+                fout.write(text)
+
+            runs = []
+            for _ in range(5):
+                begin = time.perf_counter()
+                subprocess.run([sys.executable, script, '-i', src, '-o', dst],
+                               env=env,
+                               check=True)
+                runs.append(time.perf_counter() - begin)
+            cold = min(runs)
+
+            misses, hits = [], []
+            for i in range(20):
+                begin = time.perf_counter()
+                post(f'{text}\n{kb} {i}')
+                misses.append(time.perf_counter() - begin)
+                begin = time.perf_counter()
+                post(f'{text}\n{kb} {i}')
+                hits.append(time.perf_counter() - begin)
+            print(f'{kb:>6}{cold * 1e3:>12.1f}{min(misses) * 1e3:>10.1f}'
+                  f'{min(hits) * 1e3:>10.1f}')
+
+    with urlopen(f'{url}/stats') as resp:
+        print(json.loads(resp.read())['latency_ms'])
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CASES = (
+    ('python', ['-c', 'pass']),
+    ('import new_markdown', ['-c', 'import new_markdown']),
+    ('import Markdown', ['-c', 'from new_markdown import Markdown']),
+    ('md2html --help', ['-m', 'new_markdown.cli', '--help']),
+    ('md2html empty file', ['-m', 'new_markdown.cli', '-i', '{src}', '-o',
+                            '{dst}']),
+)
+
+
+def timed(args, env, runs):
+    seconds = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        subprocess.run([sys.executable] + args,
+                       env=env,
+                       check=True,
+                       stdout=subprocess.DEVNULL)
+        seconds.append(time.perf_counter() - begin)
+    return seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Wall time of fresh interpreters importing the package '
+        'and running md2html on an empty file.')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget',
+                        type=float,
+                        default=None,
+                        help='fail if the empty md2html run takes more than '
+                        'this many ms over a bare interpreter (median)')
+    args = parser.parse_args()
+
+    # Bytecode caches are allowed and warmed first, as in an installed copy.
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = os.path.join(tmpdir, 'empty.md')
+        dst = os.path.join(tmpdir, 'empty.html')
+        open(src, 'w').close()
+
+        medians = {}
+        print(f'{"case":<22}{"min ms":>10}{"median ms":>12}')
+        for name, case in CASES:
+            case = [arg.format(src=src, dst=dst) for arg in case]
+            timed(case, env, 1)
+            seconds = timed(case, env, args.runs)
+            medians[name] = statistics.median(seconds)
+            print(f'{name:<22}{min(seconds) * 1e3:>10.1f}'
+                  f'{medians[name] * 1e3:>12.1f}')
+
+    overhead = (medians['md2html empty file'] - medians['python']) * 1e3
+    print(f'md2html overhead over python: {overhead:.1f} ms')
+    if args.budget is not None and overhead > args.budget:
+        print(f'over budget ({args.budget:.1f} ms)', file=sys.stderr)
+        sys.exit(1)
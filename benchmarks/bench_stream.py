@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from new_markdown import Markdown
+
+SECTION = """## Section {i}
+Some paragraph text with *emphasis*, **strong** text and a [link](example.com).
+Another line of the same paragraph.
+
+- item one
+- item two
+    - nested item
+
+| a | b |
+| :-- | --: |
+| 1 | 2 |
+
+```python
+print({i})
+```
+
+"""
+
+
+class NullWriter(object):
+
+    def write(self, text):
+        pass
+
+    def writelines(self, chunks):
+        for _ in chunks:
+            pass
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    md = Markdown()
+    print(f'{"input MB":>10}{"convert peak MB":>18}{"convert_iter peak MB":>22}'
+          f'{"iter MB/s":>12}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for sections in (1000, 4000, 16000):
+            path = os.path.join(tmpdir, f'{sections}.md')
+            with open(path, 'w') as fout:
+                for i in range(sections):
+                    fout.write(SECTION.format(i=i))
+            size = os.path.getsize(path) / 1e6
+
+            def run_convert():
+                with open(path) as fin:
+                    md.convert(fin.read())
+
+            def run_convert_iter():
+                with open(path) as fin:
+                    NullWriter().writelines(md.convert_iter(fin))
+
+            peak_convert = peak_memory(run_convert)
+            peak_iter = peak_memory(run_convert_iter)
+            begin = time.perf_counter()
+            run_convert_iter()
+            elapsed = time.perf_counter() - begin
+            print(f'{size:>10.1f}{peak_convert / 1e6:>18.1f}'
+                  f'{peak_iter / 1e6:>22.2f}{size / elapsed:>12.1f}')
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from corpus import CASES, generate
+from new_markdown import Markdown
+
+
+def measure(case, text, repeat):
+    md = Markdown(recording_headers=case == 'headers', header_ids='slug')
+    final = case == 'headers'
+
+    seconds = min(timed(md, text, final) for _ in range(repeat))
+    tracemalloc.start()
+    md.convert(text, final=final)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = len(text.encode('utf-8')) / 1e6
+    return {
+        'mb_s': size / seconds,
+        'lines_s': (text.count('\n') + 1) / seconds,
+        'peak_mb': peak / 1e6,
+        'seconds': seconds,
+    }
+
+
+def timed(md, text, final):
+    begin = time.perf_counter()
+    md.convert(text, final=final)
+    return time.perf_counter() - begin
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print()
+    print(f'{"case":<16}{"KB":>8}{"base MB/s":>12}{"MB/s":>10}'
+          f'{"change":>10}')
+    for case, sizes in results.items():
+        for size, stats in sizes.items():
+            base = baseline.get(case, {}).get(size)
+            if base is None:
+                continue
+            change = stats['mb_s'] / base['mb_s'] - 1
+            mark = ''
+            if change < -tolerance:
+                mark = '  <-- slower'
+                regressions.append((case, size))
+            print(f'{case:<16}{size:>8}{base["mb_s"]:>12.2f}'
+                  f'{stats["mb_s"]:>10.2f}{change:>+10.1%}{mark}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert a seeded synthetic corpus per block type and '
+        'report throughput, peak memory and scaling.')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES),
+                        default=list(CASES))
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[64, 256, 1024],
+                        help='document sizes in KB')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON written by --save')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed MB/s drop before a case is reported '
+                        'as a regression')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"case":<16}{"KB":>8}{"MB/s":>10}{"lines/s":>12}'
+          f'{"peak MB":>10}{"scaling":>10}')
+    for case in args.cases:
+        results[case] = {}
+        first = None
+        for kb in args.sizes:
+            text = generate(case, kb << 10, seed=args.seed)
+            stats = measure(case, text, args.repeat)
+            # Time per byte relative to the smallest size; 1.0 is linear.
+            if first is None:
+                first = stats['seconds'] / kb
+            stats['scaling'] = stats['seconds'] / kb / first
+            results[case][str(kb)] = stats
+            print(f'{case:<16}{kb:>8}{stats["mb_s"]:>10.2f}'
+                  f'{stats["lines_s"]:>12.0f}{stats["peak_mb"]:>10.1f}'
+                  f'{stats["scaling"]:>10.2f}')
+
+    if args.save:
+        with open(args.save, 'w') as fout:
+            json.dump(
+                {
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'seed': args.seed,
+                    'results': results,
+                },
+                fout,
+                indent=2,
+                sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fin:
+            baseline = json.load(fin)['results']
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
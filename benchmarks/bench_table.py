@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from new_markdown import Markdown
+from new_markdown.core import LINE_TABLE
+from new_markdown.elements import table, tbody, thead
+
+
+class NullWriter(object):
+
+    def writelines(self, chunks):
+        for _ in chunks:
+            pass
+
+
+def table_lines(nrows, ncols=6):
+    lines = [
+        '| ' + ' | '.join(f'col {j}' for j in range(ncols)) + ' |',
+        '| ' + ' | '.join(('--:', ':-:', ':--')[j % 3]
+                          for j in range(ncols)) + ' |'
+    ]
+    for i in range(nrows):
+        cells = [f'row {i}', f'*{i}*', f'`{i * 7}`', f'$x_{i} | y$', 'text',
+                 '[l](example.com)']
+        lines.append('| ' + ' | '.join(cells[:ncols]) + ' |')
+    return lines
+
+
+def tree_table(md, lines):
+    # The previous path: one thead/tbody tree holding every row.
+    aligns = [
+        md.table_align(l.strip()) for l in lines[1].split('|')[1:-1]
+        if l and not l.isspace()
+    ]
+    return table(children=[
+        thead(children=md.handle_th_line(lines[0], aligns=aligns)),
+        tbody(children=[
+            md.handle_td_line(line, aligns=aligns) for line in lines[2:]
+        ])
+    ])
+
+
+def stream_table(md, lines):
+    kinds = bytearray([LINE_TABLE]) * len(lines)
+    return md.handle_element(lines, 0, kinds, None)[0]
+
+
+def run(build, md, lines):
+    tracemalloc.start()
+    begin = time.perf_counter()
+    NullWriter().writelines(build(md, lines).iter_render())
+    seconds = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+if __name__ == '__main__':
+    md = Markdown()
+    print(f'{"rows":>8}{"path":>10}{"rows/s":>12}{"peak MB":>10}')
+    for nrows in (10000, 100000):
+        lines = table_lines(nrows)
+        for name, build in (('tree', tree_table), ('streamed', stream_table)):
+            seconds, peak = run(build, md, lines)
+            print(f'{nrows:>8}{name:>10}{nrows / seconds:>12.0f}'
+                  f'{peak / 1e6:>10.1f}')
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from corpus import generate
+from new_markdown import batch
+from new_markdown.watch import Watcher
+
+if __name__ == '__main__':
+    # Time to bring one edited file up to date: a fresh md2html process
+    # against a rebuild in an already running watcher.
+    script = os.path.join(ROOT, 'scripts', 'md2html')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    print(f'{"KB":>6}{"md2html ms":>12}{"watch ms":>10}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = os.path.join(tmpdir, 'doc.md')
+        dst = os.path.join(tmpdir, 'doc.html')
+        for kb in (4, 64, 512):
+            text = generate('mixed', kb << 10)
+            with open(src, 'w') as fout:
+                fout.write(text)
+
+            runs = []
+            for _ in range(5):
+                begin = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, script, '-i', src, '-o', dst, '-g', '1'],
+                    env=env,
+                    check=True)
+                runs.append(time.perf_counter() - begin)
+            cold = min(runs)
+
+            watcher = Watcher(lambda: [batch.Job(src, dst)],
+                              lambda job: batch.convert_job(
+                                  job, recording_headers=True),
+                              debounce=0)
+            watcher.poll()
+            runs = []
+            for i in range(5):
+                with open(src, 'w') as fout:
+                    fout.write(f'{text}\n{i}\n')
+                runs.append(watcher.poll().seconds)
+            warm = min(runs)
+            print(f'{kb:>6}{cold * 1e3:>12.1f}{warm * 1e3:>10.1f}')
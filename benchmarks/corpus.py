@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import random
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'vector', 'matrix', 'kernel',
+         'buffer', 'stream', 'token', 'render', 'value', '数据', '结构')
+INLINE = ('*{w}*', '**{w}**', '***{w}***', '`{w}`', '[{w}](example.com/{w})',
+          '![{w}](img/{w}.png)')
+
+
+def words(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def sentence(rng, n=12):
+    parts = []
+    for _ in range(n):
+        w = rng.choice(WORDS)
+        if rng.random() < 0.2:
+            w = rng.choice(INLINE).format(w=w)
+        parts.append(w)
+    return ' '.join(parts)
+
+
+def headers(rng, units):
+    for i in range(units):
+        level = rng.randint(1, 6)
+        yield f'{"#" * level} {words(rng, 3)} {i}'
+        yield sentence(rng)
+        yield ''
+
+
+def paragraphs(rng, units):
+    for _ in range(units):
+        for _ in range(rng.randint(1, 4)):
+            yield sentence(rng)
+        yield ''
+
+
+def lists(rng, units, depth=8):
+    for _ in range(units):
+        level = 0
+        for _ in range(20):
+            level = max(0, min(depth, level + rng.choice((-1, 0, 1))))
+            marker = rng.choice(('-', '+', '*', '1.'))
+            yield f'{"    " * level}{marker} {sentence(rng, 6)}'
+        yield ''
+
+
+def tables(rng, units, rows=50, cols=5):
+    for _ in range(units):
+        yield '| ' + ' | '.join(words(rng, 1) for _ in range(cols)) + ' |'
+        yield '| ' + ' | '.join(
+            rng.choice((':--', ':-:', '--:')) for _ in range(cols)) + ' |'
+        for _ in range(rows):
+            yield '| ' + ' | '.join(
+                sentence(rng, 3) for _ in range(cols)) + ' |'
+        yield ''
+
+
+def formula_tables(rng, units, rows=50, cols=4):
+    for _ in range(units):
+        yield '| ' + ' | '.join(words(rng, 1) for _ in range(cols)) + ' |'
+        yield '| ' + ' | '.join(':-:' for _ in range(cols)) + ' |'
+        for _ in range(rows):
+            cells = []
+            for _ in range(cols):
+                a, b = rng.randint(1, 9), rng.randint(1, 9)
+                cells.append(
+                    rng.choice((f'$x_{a} | y_{b}$', f'$\\frac{{{a}}}{{{b}}}$',
+                                f'{words(rng, 2)} $a<{b}$')))
+            yield '| ' + ' | '.join(cells) + ' |'
+        yield ''
+
+
+def code_blocks(rng, units, lines=30):
+    for _ in range(units):
+        yield f'```{rng.choice(("python", "c", "js", ""))}'
+        for i in range(lines):
+            yield f'    value_{i} = call({words(rng, 2)!r}) < {i} > 0'
+        yield '```'
+        yield ''
+
+
+def math_blocks(rng, units, lines=10):
+    for _ in range(units):
+        yield '$$'
+        for i in range(lines):
+            yield f'x_{{{i}}} = \\sum_{{k<{i}}} a_k > b'
+        yield '$$'
+        yield ''
+
+
+def blockquotes(rng, units, depth=6):
+    for _ in range(units):
+        for level in range(1, depth + 1):
+            yield f'{"> " * level}{sentence(rng, 8)}'
+        yield ''
+
+
+def images(rng, units):
+    for i in range(units):
+        w = rng.choice(WORDS)
+        yield (f'![{w}](img/{w}-{i}.png "{w}")'
+               f'{{width="{rng.randint(10, 900)}" '
+               f'height="{rng.randint(10, 900)}" class="figure"}} '
+               f'{sentence(rng, 4)}')
+        yield ''
+
+
+def mixed(rng, units):
+    generators = [gen for name, gen in CASES.items() if name != 'mixed']
+    for _ in range(units):
+        yield from rng.choice(generators)(rng, 1)
+
+
+CASES = {
+    'headers': headers,
+    'paragraphs': paragraphs,
+    'lists': lists,
+    'tables': tables,
+    'formula_tables': formula_tables,
+    'code_blocks': code_blocks,
+    'math_blocks': math_blocks,
+    'blockquotes': blockquotes,
+    'images': images,
+    'mixed': mixed,
+}
+
+
+def generate(case, size, seed=0):
+    # Appends whole units until the document reaches size characters, so
+    # the same (case, size, seed) always yields the same text.
+    rng = random.Random(f'{case}:{seed}')
+    gen = CASES[case]
+    lines, total = [], 0
+    while total < size:
+        for line in gen(rng, 1):
+            lines.append(line)
+            total += len(line) + 1
+    return '\n'.join(lines)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from new_markdown import Markdown
+
+DOC = """# Report {i}
+Paragraph with *emphasis*, `code` and a [link](example.com/{i}).
+
+## Numbers
+| name | value | formula |
+| :-- | :-: | --: |
+| row {i} | {i} | $x_{i} | y$ |
+
+> ## Quoted {i}
+> quoted text
+
+$$
+e^{{{i}}}
+$$
+"""
+
+
+def convert_range(md, lo, hi):
+    for i in range(lo, hi):
+        md.convert(DOC.format(i=i), final=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert many distinct documents on one shared Markdown '
+        'and report traced memory as the run goes on.')
+    parser.add_argument('-n', '--conversions', type=int, default=200000)
+    parser.add_argument('-j', '--threads', type=int, default=4)
+    parser.add_argument('-r', '--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    md = Markdown(recording_headers=True, header_ids='slug')
+    step = args.conversions // args.rounds
+    tracemalloc.start()
+    print(f'{"conversions":>12}{"current MB":>12}{"peak MB":>10}'
+          f'{"docs/s":>10}')
+    done = 0
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        for _ in range(args.rounds):
+            begin = time.perf_counter()
+            per = step // args.threads
+            futures = [
+                executor.submit(convert_range, md, done + k * per,
+                                done + (k + 1) * per)
+                for k in range(args.threads)
+            ]
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - begin
+            done += per * args.threads
+            current, peak = tracemalloc.get_traced_memory()
+            print(f'{done:>12}{current / 1e6:>12.2f}{peak / 1e6:>10.2f}'
+                  f'{per * args.threads / elapsed:>10.0f}')
+    tracemalloc.stop()
@@ -1,6 +1,26 @@
 # -*- coding: utf-8 -*-
 
-from new_markdown.elements import Element
-from new_markdown.core import Markdown
+__all__ = ['Element', 'Markdown']
 
-__all__ = [Element, Markdown]
+# The converter is imported on first access, so importing the package (or a
+# lightweight submodule such as new_markdown.cli) stays cheap.
+_lazy = {
+    'Element': 'new_markdown.elements',
+    'Markdown': 'new_markdown.core',
+}
+
+
+def __getattr__(name):
+    module = _lazy.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    import importlib
+
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
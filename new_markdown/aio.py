@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from new_markdown.core import Markdown
+
+# Documents at least this many characters long are converted on the large
+# executor, so they cannot occupy every worker that small documents need.
+LARGE_SIZE = 1 << 20
+MAX_CONCURRENCY = 8
+
+
+def read_text(path, encoding='utf-8'):
+    with open(path, 'r', encoding=encoding) as fin:
+        return fin.read()
+
+
+class AsyncMarkdown(object):
+
+    def __init__(self,
+                 markdown=None,
+                 executor=None,
+                 large_executor=None,
+                 max_concurrency=MAX_CONCURRENCY,
+                 large_size=LARGE_SIZE) -> None:
+        super().__init__()
+        self.markdown = markdown if markdown is not None else Markdown()
+        self.executor = executor
+        self.large_size = large_size
+        self.max_concurrency = max_concurrency
+
+        self._own_large_executor = large_executor is None
+        if large_executor is None:
+            large_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='new-markdown-large')
+        self.large_executor = large_executor
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _limit(self):
+        # One semaphore per running loop, as a semaphore binds to the loop
+        # that first waits on it; an instance can serve several loops, each
+        # limited to max_concurrency.
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def convert(self, text, final=False, timeout=None):
+        # Large documents are bounded by the large executor alone, so queued
+        # ones never hold the slots that small documents are waiting for.
+        if len(text) >= self.large_size:
+            return await self._convert(self.large_executor, text, final,
+                                       timeout)
+
+        async with self._limit():
+            return await self._convert(self.executor, text, final, timeout)
+
+    async def _convert(self, executor, text, final, timeout):
+        loop = asyncio.get_running_loop()
+        # The worker thread cannot be interrupted, so cancellation and
+        # timeouts set this event and the conversion stops at the next
+        # top-level block.
+        cancel = threading.Event()
+        future = loop.run_in_executor(executor, self.markdown.convert, text,
+                                      final, None, cancel)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except BaseException:
+            cancel.set()
+            raise
+
+    async def convert_file(self,
+                           path,
+                           final=False,
+                           timeout=None,
+                           encoding='utf-8'):
+        # One deadline covers both the read and the conversion.
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        text = await asyncio.wait_for(
+            loop.run_in_executor(self.executor, read_text, path, encoding),
+            timeout)
+        if deadline is not None:
+            timeout = max(deadline - loop.time(), 0)
+        return await self.convert(text, final=final, timeout=timeout)
+
+    def close(self):
+        if self._own_large_executor:
+            self.large_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
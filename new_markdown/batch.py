@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import glob
+import os
+import time
+from collections import namedtuple
+
+# The process pool, the render cache and the parallel renderer are imported
+# on first use, which keeps the startup of md2html short.
+from new_markdown.core import Markdown, write_atomic
+
+CACHE_SIZE = 256 << 20
+
+Job = namedtuple('Job', ['input', 'output'])
+Result = namedtuple('Result',
+                    ['input', 'output', 'size', 'seconds', 'error', 'cached'])
+
+_markdowns = {}
+_caches = {}
+
+
+def output_path(path, root=None, out_dir=None):
+    base, _ = os.path.splitext(path)
+    if out_dir is None:
+        return f'{base}.html'
+
+    if root is None:
+        base = os.path.basename(base)
+    else:
+        base = os.path.relpath(base, root)
+
+    return os.path.join(out_dir, f'{base}.html')
+
+
+def collect_jobs(sources, out_dir=None, pattern='*.md'):
+    jobs = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths = glob.glob(os.path.join(source, '**', pattern),
+                              recursive=True)
+            jobs.extend(
+                Job(path, output_path(path, root=source, out_dir=out_dir))
+                for path in sorted(paths))
+            continue
+
+        paths = sorted(glob.glob(source)) if glob.has_magic(source) else [
+            source
+        ]
+        jobs.extend(
+            Job(path, output_path(path, out_dir=out_dir)) for path in paths)
+
+    return jobs
+
+
+def read_manifest(path, out_dir=None):
+    # One input per line, optionally followed by a tab and its output path.
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as fin:
+        for line in fin:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            source, _, target = line.partition('\t')
+            jobs.append(
+                Job(source, target or output_path(source, out_dir=out_dir)))
+
+    return jobs
+
+
+def _open_cache(path, max_size):
+    cache = _caches.get(path)
+    if cache is None:
+        from new_markdown.cache import RenderCache
+
+        cache = _caches[path] = RenderCache(path, max_size=max_size)
+
+    return cache
+
+
+def convert_job(job,
+                recording_headers=False,
+                directory_title=None,
+                cache_path=None,
+                cache_size=CACHE_SIZE,
+                header_ids='random',
+                profiler=None,
+                workers=1):
+    key = (recording_headers, directory_title, header_ids, profiler)
+    md = _markdowns.get(key)
+    if md is None:
+        md = _markdowns[key] = Markdown(recording_headers=recording_headers,
+                                        directory_title=directory_title,
+                                        header_ids=header_ids,
+                                        profiler=profiler)
+
+    begin = time.perf_counter()
+    cached = False
+    try:
+        size = os.path.getsize(job.input)
+        dirname = os.path.dirname(job.output)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        cache = cache_key = html = None
+        if cache_path is not None:
+            cache = _open_cache(cache_path, cache_size)
+            cache_key = cache.file_key(job.input, md.cache_options(True))
+            html = cache.get(cache_key)
+
+        if html is not None:
+            cached = True
+            write_atomic(job.output, [html])
+        elif cache is None and workers == 1:
+            md.convert_file(job.input, job.output, final=True)
+        elif cache is None:
+            from new_markdown import parallel
+
+            parallel.convert_file(md,
+                                  job.input,
+                                  job.output,
+                                  final=True,
+                                  workers=workers)
+        else:
+            with open(job.input, 'r', encoding='utf-8') as fin:
+                html = ''.join(md.convert_iter(fin, final=True))
+            write_atomic(job.output, [html])
+            cache.put(cache_key, html)
+    except Exception as e:
+        return Result(job.input, job.output, 0,
+                      time.perf_counter() - begin, f'{type(e).__name__}: {e}',
+                      cached)
+
+    return Result(job.input, job.output, size, time.perf_counter() - begin,
+                  None, cached)
+
+
+def _convert_job(args):
+    return convert_job(*args)
+
+
+def convert_many(jobs,
+                 workers=None,
+                 recording_headers=False,
+                 directory_title=None,
+                 cache_path=None,
+                 cache_size=CACHE_SIZE,
+                 header_ids='random',
+                 chunksize=8):
+    # Yields one Result per job, in the order of `jobs`.
+    args = [(job, recording_headers, directory_title, cache_path, cache_size,
+             header_ids) for job in jobs]
+    if workers == 1 or len(args) <= 1:
+        yield from map(_convert_job, args)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_convert_job, args, chunksize=chunksize)
+
+
+def summarize(results, seconds):
+    failures = [result for result in results if result.error]
+    size = sum(result.size for result in results)
+    rate = size / seconds / 1e6 if seconds else 0.0
+    files_rate = len(results) / seconds if seconds else 0.0
+    cached = sum(1 for result in results if result.cached)
+    return (f'{len(results)} files, {len(failures)} failed, '
+            f'{cached} from cache, {size / 1e6:.2f} MB in {seconds:.2f}s '
+            f'({files_rate:.1f} files/s, {rate:.2f} MB/s)')
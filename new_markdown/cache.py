@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Bump when a change to the converter alters its output, so entries written
+# by an older version are never served.
+CACHE_VERSION = 1
+CHUNK_SIZE = 1 << 16
+# Access times are only rewritten when older than this many seconds, so a
+# hot entry does not cost a write on every hit.
+ATIME_RESOLUTION = 60.0
+EVICT_BATCH = 64
+
+
+class RenderCache(object):
+
+    def __init__(self, path, max_size=256 << 20, timeout=30.0):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.evictions = 0
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path,
+                                     timeout=timeout,
+                                     isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                           'key TEXT PRIMARY KEY, html TEXT NOT NULL, '
+                           'size INTEGER NOT NULL, atime REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_atime '
+                           'ON entries (atime)')
+        # Running total of entries.size, kept in step inside each write
+        # transaction so eviction never has to scan the table.
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta ('
+                           'name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (name, value) VALUES ('size', 0)")
+
+    @staticmethod
+    def key(text, options):
+        digest = hashlib.sha256(f'{CACHE_VERSION}:{options!r}'.encode())
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def file_key(path, options):
+        digest = hashlib.sha256(f'{CACHE_VERSION}:{options!r}'.encode())
+        digest.update(b'\0')
+        with open(path, 'r', encoding='utf-8') as fin:
+            while True:
+                chunk = fin.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk.encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT html, atime FROM entries WHERE key = ?',
+                (key, )).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            html, atime = row
+            now = time.time()
+            if now - atime > ATIME_RESOLUTION:
+                self._conn.execute(
+                    'UPDATE entries SET atime = ? WHERE key = ?', (now, key))
+
+            return html
+
+    def put(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT size FROM entries WHERE key = ?',
+                    (key, )).fetchone()
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO entries (key, html, size, atime) '
+                    'VALUES (?, ?, ?, ?)', (key, html, size, time.time()))
+                self._add_size(size - (row[0] if row else 0))
+                self.puts += 1
+                self._evict()
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def _add_size(self, delta):
+        self._conn.execute(
+            "UPDATE meta SET value = value + ? WHERE name = 'size'", (delta, ))
+
+    def _evict(self):
+        total, = self._conn.execute(
+            "SELECT value FROM meta WHERE name = 'size'").fetchone()
+        if total <= self.max_size:
+            return
+
+        while total > self.max_size:
+            rows = self._conn.execute(
+                'SELECT key, size FROM entries ORDER BY atime, rowid LIMIT ?',
+                (EVICT_BATCH, )).fetchall()
+            if not rows:
+                break
+
+            victims = []
+            freed = 0
+            for key, size in rows:
+                if total - freed <= self.max_size:
+                    break
+                victims.append((key, ))
+                freed += size
+
+            self._conn.executemany('DELETE FROM entries WHERE key = ?',
+                                   victims)
+            self._add_size(-freed)
+            self.evictions += len(victims)
+            total -= freed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute('DELETE FROM entries')
+            self._conn.execute("UPDATE meta SET value = 0 WHERE name = 'size'")
+            self._conn.execute('COMMIT')
+
+    def stats(self):
+        with self._lock:
+            entries, = self._conn.execute(
+                'SELECT COUNT(*) FROM entries').fetchone()
+            size, = self._conn.execute(
+                "SELECT value FROM meta WHERE name = 'size'").fetchone()
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'puts': self.puts,
+            'evictions': self.evictions,
+            'entries': entries,
+            'size': size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._data),
+        }
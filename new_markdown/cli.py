@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+import argparse
+import sys
+import time
+from functools import partial
+
+from new_markdown import watch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser('Parse markdown to html.')
+    parser.add_argument('sources',
+                        nargs='*',
+                        help='batch mode: markdown files, directories or globs')
+    parser.add_argument('--input', '-i', help='input markdown file')
+    parser.add_argument('--output', '-o', help="output html file")
+    parser.add_argument(
+        '--gen_dir',
+        '-g',
+        default=0,
+        help='generate a directory and place it on the top of the document')
+    parser.add_argument(
+        '--dir_title',
+        '-t',
+        default='Table of Contents',
+        help='Add a title for the directory, default: `Table of Contents`')
+    parser.add_argument(
+        '--manifest',
+        '-m',
+        help='batch mode: file listing one input per line, optionally '
+        'followed by a tab and the output path')
+    parser.add_argument(
+        '--out_dir',
+        '-d',
+        help='batch mode: write outputs here instead of next to the inputs')
+    parser.add_argument('--pattern',
+                        default='*.md',
+                        help='batch mode: file pattern used inside '
+                        'directories, default: `*.md`')
+    parser.add_argument('--jobs',
+                        '-j',
+                        type=int,
+                        default=None,
+                        help='batch mode: number of worker processes, '
+                        'default: number of CPUs; with --input, render the '
+                        'one file on this many processes')
+
+    parser.add_argument(
+        '--header_ids',
+        choices=['random', 'slug'],
+        default='random',
+        help='how generated header ids are made: `random` (default) or '
+        '`slug`, derived from the header text so output is reproducible')
+    parser.add_argument('--cache',
+                        help='path of an on-disk render cache (SQLite) shared '
+                        'between runs and worker processes')
+    parser.add_argument('--cache_size',
+                        type=int,
+                        default=256,
+                        help='maximum size of the render cache in MB, '
+                        'default: 256')
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help='convert in this process and print the time '
+                        'and output size of each block handler and inline '
+                        'stage to stderr')
+
+    parser.add_argument('--watch',
+                        '-w',
+                        action='store_true',
+                        help='keep running and convert inputs again as they '
+                        'change')
+    parser.add_argument('--interval',
+                        type=float,
+                        default=watch.INTERVAL,
+                        help='watch mode: seconds between polls, default: '
+                        f'{watch.INTERVAL}')
+    parser.add_argument('--debounce',
+                        type=float,
+                        default=watch.DEBOUNCE,
+                        help='watch mode: rebuild once no input has changed '
+                        f'for this many seconds, default: {watch.DEBOUNCE}')
+
+    args = parser.parse_args(argv)
+    # Imported only once there is something to convert, so --help and
+    # argument errors do not pay for the converter.
+    from new_markdown import batch
+
+    cache_size = args.cache_size << 20
+    profiler = None
+    if args.profile:
+        from new_markdown.profile import Profiler
+
+        profiler = Profiler()
+    if args.watch:
+        if args.input and not args.output:
+            parser.error('--output is required with --input')
+        if not args.input and not args.sources and not args.manifest:
+            parser.error('either --input/--output or batch sources are '
+                         'required')
+
+        def collect():
+            if args.input:
+                return [batch.Job(args.input, args.output)]
+
+            jobs = batch.collect_jobs(args.sources,
+                                      out_dir=args.out_dir,
+                                      pattern=args.pattern)
+            if args.manifest:
+                jobs.extend(
+                    batch.read_manifest(args.manifest, out_dir=args.out_dir))
+            return jobs
+
+        def report(rebuild):
+            for result in rebuild.results:
+                if result.error:
+                    print(f'FAILED {result.input}: {result.error}',
+                          file=sys.stderr)
+            print(f'{batch.summarize(rebuild.results, rebuild.seconds)}, '
+                  f'{rebuild.latency * 1e3:.0f} ms after the first change',
+                  file=sys.stderr)
+            if profiler is not None:
+                print(profiler.report(), file=sys.stderr)
+                profiler.reset()
+
+        convert = partial(batch.convert_job,
+                          recording_headers=args.gen_dir,
+                          directory_title=args.dir_title,
+                          cache_path=args.cache,
+                          cache_size=cache_size,
+                          header_ids=args.header_ids,
+                          profiler=profiler)
+        watch.Watcher(collect,
+                      convert,
+                      interval=args.interval,
+                      debounce=args.debounce,
+                      report=report).run()
+        return 0
+
+    if args.input:
+        if not args.output:
+            parser.error('--output is required with --input')
+
+        result = batch.convert_job(batch.Job(args.input, args.output),
+                                   recording_headers=args.gen_dir,
+                                   directory_title=args.dir_title,
+                                   cache_path=args.cache,
+                                   cache_size=cache_size,
+                                   header_ids=args.header_ids,
+                                   profiler=profiler,
+                                   workers=1 if args.profile else args.jobs
+                                   or 1)
+        if profiler is not None:
+            print(profiler.report(), file=sys.stderr)
+        if result.error:
+            print(f'FAILED {result.input}: {result.error}', file=sys.stderr)
+            return 1
+        return 0
+
+    if not args.sources and not args.manifest:
+        parser.error('either --input/--output or batch sources are required')
+
+    jobs = batch.collect_jobs(args.sources,
+                              out_dir=args.out_dir,
+                              pattern=args.pattern)
+    if args.manifest:
+        jobs.extend(batch.read_manifest(args.manifest, out_dir=args.out_dir))
+
+    begin = time.perf_counter()
+    options = dict(recording_headers=args.gen_dir,
+                   directory_title=args.dir_title,
+                   cache_path=args.cache,
+                   cache_size=cache_size,
+                   header_ids=args.header_ids)
+    if profiler is None:
+        converted = batch.convert_many(jobs, workers=args.jobs, **options)
+    else:
+        # Worker processes would each hold their own profile.
+        converted = (batch.convert_job(job, profiler=profiler, **options)
+                     for job in jobs)
+
+    results = []
+    for result in converted:
+        results.append(result)
+        if result.error:
+            print(f'FAILED {result.input}: {result.error}', file=sys.stderr)
+
+    if profiler is not None:
+        print(profiler.report(), file=sys.stderr)
+    print(batch.summarize(results, time.perf_counter() - begin),
+          file=sys.stderr)
+    return 1 if any(result.error for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
-import hashlib
 import os
-import re
-import secrets
+from collections import namedtuple
+from functools import partial
+from types import MappingProxyType, MethodType
 
 from new_markdown.elements import (a, blockquote, code, div, hlcode, hr, img,
-                                   table, tbody, td, th, thead, tr)
+                                   streamed_table, table, td, th, thead, tr)
 from new_markdown.elements import em
 from new_markdown.elements import h1, h2, h3, h4, h5, h6
 from new_markdown.elements import p
 from new_markdown.elements import strong
 from new_markdown.elements import ul, ol, li
+from new_markdown.elements import link_href
+from new_markdown.document import Document, DirNode
+from new_markdown.document import directory_element, iter_render
+from new_markdown.extensions import FENCE, INDENTED, LINE, RUN, Registry
 
 tags = {
     'h1': h1,
@@ -23,248 +27,594 @@ tags = {
 
 SPECIAL_CHARS = r'#>-+=|`'
 
+# `random` keeps the historical random hex ids, `slug` derives them from
+# the header text so the same input always renders the same ids.
+HEADER_ID_MODES = ('random', 'slug')
+
+# Records returned by Markdown.scan.
+Heading = namedtuple('Heading', ['level', 'text', 'id'])
+Link = namedtuple('Link', ['text', 'href'])
+Image = namedtuple('Image', ['src', 'alt', 'title', 'attrs'])
+Metadata = namedtuple(
+    'Metadata',
+    ['headings', 'links', 'images', 'inline_formulas', 'display_formulas'])
+
 re_head_pattern = r'(?P<nheads>#{1,6})\s*(?P<title>[^{]*)({#(?P<headid>.*)})?'
 ordered_list_ptn = r'^\s*\d*\.(?P<title>.*)'
 unordered_list_ptn = r'^\s*([-+]) (?P<title>.*)'
 list_ptn = r'^\s*(\d*\.|[-+]) (?P<title>.*)'
-strong_em_ptn = r'(?P<pre_content>.*)((?<!\\)\*{3})(?P<content>.*)'\
-    r'((?<!\\)\*{3})(?P<post_content>.*)'
-strong_ptn = r'(?P<pre_content>.*)((?<!\\)\*{2})(?P<content>.*)'\
-    r'((?<!\\)\*{2})(?P<post_content>.*)'
-em_ptn = r'(?P<pre_content>.*)((?<!\\)\*)(?P<content>.*)((?<!\\)\*)'\
-    r'(?P<post_content>.*)'
-img_ptn = r'(?P<pre>.*)![\[](?P<alt>[^]]*)[\]][\(](?P<src>[^()\[\] \t]*)'\
-    r'[ \t]*'\
-    r'\"?(?P<title>([^)\"]*)?)\"?[\)]'\
-    r'(?P<attrs>([\{]+.*[\}]+)?)'\
-    r'(?P<post>.*)'
-# img_ptn = r'(?P<pre>.*)![\[](?P<alt>[^]]*)[\]][\(](?P<src>[^(]*)[\)]'\
-#     r'(?P<post>.*)'
-link_ptn = r'(?P<pre>.*)((?<![!])[\[])(?P<text>[^]]*)[\]][\(]'\
-    r'(?P<href>[^(]*)[\)](?P<post>.*)'
+img_ptn = r'!\[(?P<alt>[^][]*)\]\((?P<src>[^()\[\] \t]*)[ \t]*'\
+    r'"?(?P<title>[^][)"]*)"?\)(?P<attrs>\{[^{}]*\})?'
+link_ptn = r'\[(?P<text>[^][]*)\]\((?P<href>[^()]*)\)'
 hr_ptn = r'^[*-]{3,}$'
 tr_line_filter = r'^[|].*[|]$'
 tr_ptn = r'[^|]*[|]'
-code_ptn = r'(?P<pre>.*)((?<!\\)`)(?P<text>[^`]*)((?<!\\)`)(?P<post>.*)'
 code_block_open_ptn = r'^```(?P<language>\w*)'
 code_block_close_ptn = r'^```$'
 math_latex_ptn = r'^\$\$$'
 img_attr_ptns = r'(?P<name>[^=" \t]*)="(?P<value>[^"]*)"'
-single_line_math_latex_ptn = r'^(?P<pre>.*)((?<!\\)\$)'\
-    r'(?P<formula>[^$]*)((?<!\\)\$)(?P<post>.*)$'
-formula_placement_ptn = r'^(?P<pre>.*)'\
-    r'###FML[>](?P<digest>[0-9a-f]{40})[<]###(?P<post>.*)$'
-
-
-class DirNode(object):
-
-    def __init__(self, level, link, text, children, parent):
-        self.level = level
-        self.link = link
-        self.text = text
-        self.children = children
-        self.parent = parent
-
-    def add_node(self, node):
-        if node.level > self.level:
-            if not self.children:
-                node.parent = self
-                self.children = [node]
-                return self
-            node.parent = self
-            self.children[-1].add_node(node)
-            return self
-
-        if node.level == self.level and self.parent:
-            node.parent = self.parent
-            self.parent.children.append(node)
-            return self.parent
-
-        parent = DirNode(level=node.level - 1,
-                         link=None,
-                         text=None,
-                         children=[self, node],
-                         parent=None)
-        self.parent = parent
-        node.parent = parent
-
-        return parent
-
-    def build_node(self, list_type='ol'):
-        if list_type == 'ul':
-            list_type = ul
-        else:
-            list_type = ol
-        ele = li(children=[])
-        if self.text:
-            ele.add_child(a(text=self.text, href=f'#{self.link}'))
+slug_ptn = r'[^\w]+'
 
-        if self.children:
-            children = [child.build_node() for child in self.children]
-            ele.add_child(list_type(children=children))
-
-        return ele
 
-    def show(self, depth=1):
-        print('->', '    ' * depth, f'{self}')
-        for child in self.children:
-            child.show(depth + 1)
+class LazyPattern(object):
+    # Stands in for re.compile(pattern) at module level: re is imported and
+    # the expression compiled on first use, then the compiled methods are
+    # bound onto the instance so later calls never come back here.
+    methods = ('search', 'match', 'fullmatch', 'finditer', 'findall', 'split',
+               'sub', 'subn')
 
-    def __str__(self):
-        return f'{self.level} - {self.link} - {self.text}'
+    def __init__(self, pattern, flags=0) -> None:
+        super().__init__()
+        self.pattern = pattern
+        self.flags = flags
+
+    def __getattr__(self, name):
+        import re
+
+        compiled = re.compile(self.pattern, self.flags)
+        for method in self.methods:
+            setattr(self, method, getattr(compiled, method))
+        return getattr(compiled, name)
+
+    # Like compiled patterns, equal expressions compare equal and survive
+    # pickling, so registries holding them can be sent to worker processes.
+    def __reduce__(self):
+        return self.__class__, (self.pattern, self.flags)
+
+    def __eq__(self, other):
+        if not isinstance(other, LazyPattern):
+            return NotImplemented
+        return (self.pattern, self.flags) == (other.pattern, other.flags)
+
+    def __hash__(self):
+        return hash((self.pattern, self.flags))
+
+
+re_head_re = LazyPattern(re_head_pattern)
+ordered_list_re = LazyPattern(ordered_list_ptn)
+list_re = LazyPattern(list_ptn)
+hr_re = LazyPattern(hr_ptn)
+tr_line_re = LazyPattern(tr_line_filter)
+code_block_open_re = LazyPattern(code_block_open_ptn)
+code_block_close_re = LazyPattern(code_block_close_ptn)
+math_latex_re = LazyPattern(math_latex_ptn)
+img_re = LazyPattern(img_ptn)
+link_re = LazyPattern(link_ptn)
+img_attr_re = LazyPattern(img_attr_ptns)
+slug_re = LazyPattern(slug_ptn)
+
+# Kinds assigned to every source line by `classify_line`. They fit in a
+# byte, so a whole document is tagged with a single bytearray.
+LINE_BLANK = 0
+LINE_HR = 1
+LINE_HEADER = 2
+LINE_QUOTE = 3
+LINE_LIST = 4
+LINE_TABLE = 5
+LINE_CODE = 6
+LINE_MATH = 7
+LINE_TEXT = 8
+
+
+def classify_line(line, rules=None):
+    # `rules` maps the first character of a line to candidate (kind,
+    # pattern) pairs, tried in order, as built by Registry.line_rules. A
+    # pattern of None means the first character alone decides the kind;
+    # lines without a rule are plain text. The default is LINE_RULES.
+    if not line or line.isspace():
+        return LINE_BLANK
+
+    if rules is None:
+        rules = LINE_RULES
+    first = line[0]
+    candidates = rules.get(first)
+    if candidates is None:
+        if not (first.isspace() or first.isdecimal()):
+            return LINE_TEXT
+        candidates = rules.get(INDENTED, ())
+
+    for kind, ptn in candidates:
+        if ptn is None or ptn.search(line):
+            return kind
+
+    return LINE_TEXT
+
+
+def classify_lines(lines, rules=None):
+    return bytearray(map(partial(classify_line, rules=rules), lines))
+
+
+QUOTE_ATTRS = MappingProxyType({'class': 'blockquote'})
+# One read-only attribute map per alignment, shared by every cell.
+ALIGN_ATTRS = {
+    align: MappingProxyType({'style': f'text-align: {align}'})
+    for align in ('left', 'center', 'right')
+}
 
+SPOOL_SIZE = 1 << 24
+BLOCK_CACHE_MAX_LINES = 256
+# Table rows rendered per chunk yielded by a streamed table.
+TABLE_ROW_BATCH = 256
+CHUNK_SIZE = 1 << 16
+# Up to this many inline trigger characters, a line is searched for each
+# one, which beats hashing every character of the line; past it, it is not.
+SEARCHED_TRIGGERS = 16
+
+
+def _continues_block(block_kind, line, kind, run_kinds):
+    if block_kind == LINE_TEXT:
+        return kind in (LINE_TEXT, LINE_LIST) and line[0] not in SPECIAL_CHARS
+
+    return kind == block_kind and kind in run_kinds
+
+
+def _chomp(line):
+    if line.endswith('\n'):
+        line = line[:-1]
+    return line[:-1] if line.endswith('\r') else line
+
+
+def _text(line, lo, hi, out):
+    # The end of every inline pipeline.
+    if lo < hi:
+        out.append(line[lo:hi])
+
+
+def _compact(children):
+    # Elements keep a lone text child as a plain str.
+    if len(children) == 1 and children[0].__class__ is str:
+        return children[0]
+    return children
+
+
+def _unescaped(line, lo, i):
+    return i == lo or line[i - 1] != '\\'
+
+
+def _formula_spans(line, lo, hi):
+    # `$...$` and `$$...$$` spans in line[lo:hi] as (start, end) pairs,
+    # delimiters included. Like emphasis they pair up from the right; an
+    # inline formula holds no `$`, while a `$` inside `$$...$$` is content.
+    marks = []
+    i = line.find('$', lo, hi)
+    while i != -1:
+        if _unescaped(line, lo, i):
+            width = 2 if line.startswith('$$', i, hi) else 1
+            marks.append((i, width))
+            i += width - 1
+        i = line.find('$', i + 1, hi)
+
+    spans = []
+    closing = None
+    for mark in reversed(marks):
+        if closing is None:
+            closing = mark
+        elif mark[1] == closing[1]:
+            spans.append((mark[0], closing[0] + closing[1]))
+            closing = None
+        elif mark[1] == 2:
+            closing = mark
+
+    spans.reverse()
+    return spans
+
+
+def _code_spans(line, lo, hi):
+    # Backtick pairs as (opening, closing) indexes, paired from the right.
+    ticks = []
+    i = line.find('`', lo, hi)
+    while i != -1:
+        ticks.append(i)
+        i = line.find('`', i + 1, hi)
+
+    spans = []
+    j = len(ticks) - 1
+    while j > 0:
+        if _unescaped(line, lo, ticks[j - 1]) and _unescaped(
+                line, lo, ticks[j]):
+            spans.append((ticks[j - 1], ticks[j]))
+            j -= 2
+        else:
+            j -= 1
+
+    spans.reverse()
+    return spans
+
+
+def _delimiter_pairs(line, lo, hi, token):
+    # Emphasis delimiters pair up from the right: the last delimiter closes
+    # against the nearest one before it that does not overlap, and so on
+    # leftwards. One find() pass collects them, so this is linear.
+    width = len(token)
+    stack = []
+    i = line.find(token, lo, hi)
+    while i != -1:
+        if _unescaped(line, lo, i):
+            stack.append(i)
+        i = line.find(token, i + 1, hi)
+
+    pairs = []
+    while stack:
+        closing = stack.pop()
+        while stack and stack[-1] + width > closing:
+            stack.pop()
+        if not stack:
+            break
+        opening = stack.pop()
+        while stack and stack[-1] + width > opening:
+            stack.pop()
+        pairs.append((opening, closing))
+
+    pairs.reverse()
+    return pairs
+
+
+def write_atomic(path, chunks, encoding='utf-8'):
+    # The text goes to a temporary file beside path, renamed over it once
+    # complete, so readers never see a partial document.
+    tmp_path = f'{path}.{os.urandom(4).hex()}.tmp'
+    try:
+        with open(tmp_path, 'x', encoding=encoding) as fout:
+            fout.writelines(chunks)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def directory_first(body, directory, spool_size=SPOOL_SIZE):
+    # Yields the elements directory() returns, then the rendered body. The
+    # directory is only known once every header has been seen, so the body
+    # is spooled (to disk past spool_size) first.
+    import tempfile
+
+    with tempfile.SpooledTemporaryFile(max_size=spool_size,
+                                       mode='w+',
+                                       encoding='utf-8') as spool:
+        spool.writelines(body)
+        head = directory()
+        yield from iter_render(head)
+        if not spool.tell():
+            return
 
-class Markdown(object):
+        spool.seek(0)
+        if head:
+            yield os.linesep
+        while True:
+            chunk = spool.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
 
-    def __init__(self, recording_headers=False, directory_title=None) -> None:
-        super().__init__()
-        self.recording_headers = recording_headers
-        self.directory_title = directory_title
 
-        self.dir_root = None
-        self.forward_buffer = {}
+class ConvertCancelled(Exception):
+    pass
 
-    def handle_header_stack(self, level):
-        idx = len(self.header_recordings) - 1
-        while idx >= 0 and self.header_recordings[idx].level == level:
-            idx -= 1
 
-        if idx < 0:
-            ele = ul(children=self.header_recordings)
-            self.header_recordings = [ele]
-            return
+class ConvertContext(object):
+    # Everything that belongs to one document rather than to the Markdown
+    # configuration, so a single Markdown can convert on many threads.
 
-        ele = ul(children=self.header_recordings[idx + 1:])
-        self.header_recordings = self.header_recordings[:idx + 1] + [ele]
+    def __init__(self, cancel=None) -> None:
+        super().__init__()
+        # The directory hangs off a synthetic level-0 root. dir_stack holds
+        # the path from it to the last header added.
+        self.dir_root = DirNode(level=0,
+                                link=None,
+                                text=None,
+                                children=[],
+                                parent=None)
+        self.dir_stack = [self.dir_root]
+        self.used_header_ids = {}
+        # Anything with an is_set() method, e.g. a threading.Event; it is
+        # polled between top-level blocks.
+        self.cancel = cancel
 
     def add_to_directory(self, level, hid, text):
+        stack = self.dir_stack
+        while stack[-1].level >= level:
+            stack.pop()
         node = DirNode(level=level,
                        link=hid,
                        text=text,
                        children=[],
-                       parent=None)
-        if self.dir_root is None:
-            self.dir_root = node
-            return
+                       parent=stack[-1])
+        stack[-1].children.append(node)
+        stack.append(node)
+
+    def reserve_header_id(self, hid):
+        # Explicit ids are kept as written but block later generated ones.
+        self.used_header_ids.setdefault(hid, 1)
+
+    def register_header_id(self, hid):
+        # used_header_ids maps every id handed out to the next numeric
+        # suffix to try for it, so repeated titles resolve in O(1).
+        used = self.used_header_ids
+        if hid not in used:
+            used[hid] = 1
+            return hid
+
+        n = used[hid]
+        while f'{hid}-{n}' in used:
+            n += 1
+        used[hid] = n + 1
+        hid = f'{hid}-{n}'
+        used[hid] = 1
+        return hid
 
-        self.dir_root = self.dir_root.add_node(node)
 
-    def extract_ul_directory(self):
-        if not self.recording_headers:
-            raise ValueError('You did not require recording headers.')
+class Markdown(object):
 
-        return self.table_of_contents[0][0]
+    def __init__(self,
+                 recording_headers=False,
+                 directory_title=None,
+                 cache=None,
+                 block_cache=None,
+                 header_ids='random',
+                 profiler=None,
+                 extensions=None) -> None:
+        super().__init__()
+        if header_ids not in HEADER_ID_MODES:
+            raise ValueError(f'Unknown header id mode: {header_ids}')
+
+        self.recording_headers = recording_headers
+        self.directory_title = directory_title
+        self.cache = cache
+        self.block_cache = block_cache
+        self.header_ids = header_ids
+        self.profiler = profiler
+        # A copy, so the tables compiled from it below stay in sync.
+        self.extensions = (default_extensions()
+                           if extensions is None else extensions.copy())
+
+        blocks = self.extensions.blocks
+        self._line_rules = self.extensions.line_rules()
+        self._fence_closers = {
+            ext.kind: ext.close
+            for ext in blocks if ext.layout == FENCE
+        }
+        self._line_kinds = frozenset([LINE_BLANK] + [
+            ext.kind for ext in blocks if ext.layout == LINE])
+        self._run_kinds = frozenset(ext.kind for ext in blocks
+                                    if ext.layout == RUN)
+        self._handlers = self.block_handlers()
+
+        # Inline stages in pipeline order, and for each trigger character
+        # the bit mask of the stages it enables. Each line runs through the
+        # pipeline of only the stages whose triggers it contains.
+        inlines = self.extensions.inline_order()
+        self._stages = [(ext.name, self._bind(ext.stage)) for ext in inlines]
+        masks = {}
+        for bit, ext in enumerate(inlines):
+            for char in ext.triggers:
+                masks[char] = masks.get(char, 0) | 1 << bit
+        self._trigger_masks = masks
+        self._triggers = frozenset(masks)
+        self._trigger_items = (tuple(masks.items())
+                               if len(masks) <= SEARCHED_TRIGGERS else None)
+        self._pipelines = {}
+        self._inline_names = frozenset(ext.name for ext in inlines)
+        # Cache keys carry the options, so differently configured instances
+        # can share one cache. The in-process block cache compares the
+        # registry itself; the persistent cache gets a stable description
+        # of every extension instead.
+        self._extensions_key = tuple(
+            self._extension_key(ext)
+            for ext in self.extensions.blocks + self.extensions.inlines)
+        self._block_options = self._options() + (self.__class__,
+                                                 self.extensions)
+
+        if profiler is not None:
+            profiler.attach(self)
+
+    def extract_ul_directory(self, textlines):
+        root = self.outline(textlines)
+        return ul(children=[child.build_node('ul') for child in root.children])
 
     def random_header_id(self, level=1):
-        return f'id-h{level}-{secrets.token_hex(6)}'
+        return f'id-h{level}-{os.urandom(6).hex()}'
+
+    def slug_header_id(self, ctx, text, level=1):
+        slug = slug_re.sub('-', text.strip().lower()).strip('-')
+        return ctx.register_header_id(slug or f'h{level}')
 
-    def header(self, lines, start):
-        info = re.search(re_head_pattern, lines[start]).groupdict()
+    def header_anchor(self, line, ctx, record):
+        info = re_head_re.search(line).groupdict()
         attrs = {}
         if info['headid']:
             attrs['id'] = info['headid']
+            if self.header_ids == 'slug':
+                ctx.reserve_header_id(info['headid'])
         level = len(info["nheads"])
-        # print(level, info['title'])
-        if self.recording_headers and not attrs.get('id', None):
-            attrs['id'] = self.random_header_id(level=level)
-        ele = tags[f'h{level}'](children=info['title'].strip(), attrs=attrs)
-
-        if self.recording_headers:
-            self.add_to_directory(level, attrs['id'], text=info['title'])
-
-        return ele, start + 1
-
-    def _fetch_all(self, lines, start, startswith):
-        assert (lines[start].startswith(startswith))
-
-        matched_lines = []
-        while True:
-            if start >= len(lines) or not lines[start].startswith(startswith):
-                break
-            matched_lines.append(lines[start])
-            start += 1
-
-        return matched_lines, start
+        if record and not attrs.get('id', None):
+            if self.header_ids == 'slug':
+                attrs['id'] = self.slug_header_id(ctx,
+                                                  info['title'],
+                                                  level=level)
+            else:
+                attrs['id'] = self.random_header_id(level=level)
 
-    def _fetch_all_ptn(self, lines, start, ptn):
-        matched_lines = []
-        while True:
-            if start >= len(lines) or not re.search(ptn, lines[start]):
-                break
+        if record:
+            ctx.add_to_directory(level, attrs['id'], text=info['title'])
 
-            matched_lines.append(lines[start])
-            start += 1
+        return level, info['title'], attrs
 
-        return matched_lines, start
+    def header(self, lines, start, kinds, ctx):
+        level, title, attrs = self.header_anchor(lines[start], ctx,
+                                                 self.recording_headers)
+        ele = tags[f'h{level}'](children=title.strip(), attrs=attrs)
+        return ele, start + 1
 
-    def _fetch_all_until(self, lines, start, ptn):
-        matched_lines = []
+    def _fetch_all(self, lines, start, kinds):
+        kind = kinds[start]
+        nstart = start + 1
+        while nstart < len(lines) and kinds[nstart] == kind:
+            nstart += 1
+
+        return lines[start:nstart], nstart
+
+    def _fetch_all_until(self, lines, start, kinds, ptn):
+        kind = kinds[start]
+        nstart = start + 1
+        while nstart < len(lines):
+            if kinds[nstart] == kind and ptn.search(lines[nstart]):
+                return lines[start + 1:nstart], nstart + 1
+            nstart += 1
+
+        return None, start + 1
+
+    def blockquote(self, lines, start, kinds, ctx):
+        matched_lines, nstart = self._fetch_all(lines, start, kinds)
+        # Nested quotes are walked with an explicit stack instead of
+        # recursion. Each frame holds the remaining blocks of one quote level
+        # and the HTML rendered for it so far.
+        stack = [(self._quote_blocks(matched_lines), [])]
         while True:
+            blocks, parts = stack[-1]
+            for block, block_kinds in blocks:
+                if ctx.cancel is not None and ctx.cancel.is_set():
+                    raise ConvertCancelled()
 
-            if start >= len(lines) or re.search(ptn, lines[start]):
-                matched_lines.append(lines[start])
-                start += 1
-                break
-
-            matched_lines.append(lines[start])
-            start += 1
-
-        return matched_lines, start
-
-    def blockquote(self, lines, start):
-        startswith = '>'
-        matched_lines, nstart = self._fetch_all(lines=lines,
-                                                start=start,
-                                                startswith=startswith)
-        if matched_lines[0].startswith('> '):
-            idx = 2
-        else:
-            idx = 1
-
-        quote_lines = self.convert([l[idx:] for l in matched_lines])
+                if block_kinds[0] == LINE_QUOTE:
+                    stack.append((self._quote_blocks(block), []))
+                    break
 
-        return blockquote(quote_lines, attrs={'class': 'blockquote'}), nstart
+                for ele in self.memoized_elements(block, block_kinds, ctx):
+                    text = f'{ele}'
+                    if text:
+                        parts.append(text)
+            else:
+                stack.pop()
+                ele = blockquote(os.linesep.join(parts), attrs=QUOTE_ATTRS)
+                if not stack:
+                    return ele, nstart
+                stack[-1][1].append(f'{ele}')
 
-    def em(self, line):
-        if not line:
-            return []
-        res = re.search(em_ptn, line)
-        if not res:
-            return self.img(line)
+    def _quote_blocks(self, lines):
+        # The width of the first line's marker is stripped from every line.
+        width = 2 if lines[0].startswith('> ') else 1
+        return self.split_blocks(line[width:] for line in lines)
 
+    def code(self, line):
         children = []
-        d = res.groupdict()
-        children.extend(self.em(d['pre_content']))
-        ele = em(children=d['content'])
-        children += [ele]
-        children.extend(self.em(d['post_content']))
-
+        if line:
+            mask = 0
+            if self._trigger_items is not None:
+                for char, bits in self._trigger_items:
+                    if char in line:
+                        mask |= bits
+            else:
+                for char in self._triggers.intersection(line):
+                    mask |= self._trigger_masks[char]
+            pipeline = self._pipelines.get(mask)
+            if pipeline is None:
+                pipeline = self._pipelines[mask] = self._pipeline(mask)
+            pipeline(line, 0, len(line), children)
         return children
 
-    def strong(self, line):
-        if not line:
-            return []
-        res = re.search(strong_ptn, line)
-        if not res:
-            return self.em(line)
+    def _pipeline(self, mask):
+        pipeline = _text
+        for bit in reversed(range(len(self._stages))):
+            if mask >> bit & 1:
+                pipeline = partial(self._stages[bit][1], nxt=pipeline)
+        return pipeline
+
+    def _code(self, line, lo, hi, out, nxt):
+        for opening, closing in _code_spans(line, lo, hi):
+            nxt(line, lo, opening, out)
+            out.append(
+                code(children=self.handle_speci_char(line[opening +
+                                                          1:closing])))
+            lo = closing + 1
+        nxt(line, lo, hi, out)
+
+    def _math(self, line, lo, hi, out, nxt):
+        # Formulas are left as they are for MathJax, so nothing inside them
+        # reaches the emphasis, image or link stages.
+        if line.find('$', lo, hi) == -1:
+            nxt(line, lo, hi, out)
+            return
 
-        children = []
-        d = res.groupdict()
-        children.extend(self.strong(d['pre_content']))
-        ele = strong(children=self.em(d['content']))
-        children += [ele]
-        children.extend(self.strong(d['post_content']))
+        for opening, closing in _formula_spans(line, lo, hi):
+            nxt(line, lo, opening, out)
+            out.append(line[opening:closing])
+            lo = closing
+        nxt(line, lo, hi, out)
+
+    def _strong_em(self, line, lo, hi, out, nxt):
+        for opening, closing in _delimiter_pairs(line, lo, hi, '***'):
+            nxt(line, lo, opening, out)
+            children = []
+            nxt(line, opening + 3, closing, children)
+            out.append(strong(children=[em(children=children)]))
+            lo = closing + 3
+        nxt(line, lo, hi, out)
+
+    def _strong(self, line, lo, hi, out, nxt):
+        for opening, closing in _delimiter_pairs(line, lo, hi, '**'):
+            nxt(line, lo, opening, out)
+            children = []
+            nxt(line, opening + 2, closing, children)
+            out.append(strong(children=children))
+            lo = closing + 2
+        nxt(line, lo, hi, out)
+
+    def _em(self, line, lo, hi, out, nxt):
+        for opening, closing in _delimiter_pairs(line, lo, hi, '*'):
+            nxt(line, lo, opening, out)
+            out.append(em(children=line[opening + 1:closing]))
+            lo = closing + 1
+        nxt(line, lo, hi, out)
+
+    def _img(self, line, lo, hi, out, nxt):
+        if lo >= hi:
+            return
 
-        return children
+        pieces = []
+        i = line.find('![', lo, hi)
+        while i != -1:
+            res = img_re.match(line, i, hi)
+            if not res:
+                i = line.find('![', i + 1, hi)
+                continue
 
-    def img(self, line):
-        if not line or line.isspace():
-            return []
-        res = re.search(img_ptn, line)
-        if not res:
-            return self.a(line)
+            pieces.append(line[lo:i])
+            pieces.append(f'{self._img_element(res)}')
+            lo = res.end()
+            i = line.find('![', lo, hi)
 
-        children = []
+        if not pieces:
+            nxt(line, lo, hi, out)
+            return
+
+        # Images render first so that a link can wrap them, e.g.
+        # `[![alt](src)](href)`.
+        pieces.append(line[lo:hi])
+        atext = ''.join(pieces)
+        nxt(atext, 0, len(atext), out)
+
+    def _img_element(self, res):
         d = res.groupdict()
         ele = img(src=d['src'])
         if d['alt']:
@@ -272,212 +622,173 @@ class Markdown(object):
         if d['title']:
             ele.add_attr('title', d['title'])
         if d['attrs']:
-            nres = re.findall(img_attr_ptns, d['attrs'][1:-1])
-            for name, value in nres:
+            for name, value in img_attr_re.findall(d['attrs'][1:-1]):
                 ele.add_attr(name, value)
 
-        children.extend(self.img(d['pre']))
-        children.append(ele)
-        children.extend(self.img(d['post']))
-
-        atext = ''.join([f'{child}' for child in children])
-        return self.a(atext)
-
-    def a(self, line):
-        if not line or line.isspace():
-            return []
-        res = re.search(link_ptn, line)
-        if not res:
-            return [line]
-
-        children = []
-        d = res.groupdict()
-        children.extend(self.a(d['pre']))
-        children.append(a(text=d['text'], href=d['href']))
-        children.extend(self.a(d['post']))
-
-        return children
+        return ele
 
-    def strong_em(self, line):
-        if not line:
-            return []
-        res = re.search(strong_em_ptn, line)
-        if not res:
-            return self.strong(line)
+    def _a(self, line, lo, hi, out, nxt):
+        i = line.find('[', lo, hi)
+        while i != -1:
+            res = None
+            if i == lo or line[i - 1] != '!':
+                res = link_re.match(line, i, hi)
+            if not res:
+                i = line.find('[', i + 1, hi)
+                continue
 
-        children = []
-        d = res.groupdict()
-        children.extend(self.strong_em(d['pre_content']))
-        ele = strong(children=[em(children=self.strong(d['content']))])
-        children += [ele]
-        children.extend(self.strong_em(d['post_content']))
+            if lo < i:
+                out.append(line[lo:i])
+            d = res.groupdict()
+            out.append(a(text=d['text'], href=d['href']))
+            lo = res.end()
+            i = line.find('[', lo, hi)
 
-        return children
+        nxt(line, lo, hi, out)
 
-    def p(self, lines, start):
-        # print('*' * 30, 'p')
+    def p(self, lines, start, kinds, ctx):
         ostart = start
-        while True:
-            if start >= len(lines) or not lines[start] or lines[start].isspace(
-            ) or lines[start][0] in SPECIAL_CHARS or re.search(
-                    hr_ptn, lines[start]) or re.search(math_latex_ptn,
-                                                       lines[start]):
-                break
+        start += 1
+        while start < len(lines) and kinds[start] in (
+                LINE_TEXT, LINE_LIST) and lines[start][0] not in SPECIAL_CHARS:
             start += 1
 
         children = []
         for i in range(ostart, start):
-            if re.search(hr_ptn, lines[i]):
-                children.append(hr())
-                continue
-
             grand_children = self.code(lines[i].strip())
             if lines[i][-2:] == '  ':
                 grand_children.append('<br>')
             children.extend(grand_children)
-        ele = p(children=children)
+        ele = p(children=_compact(children))
         return ele, start
 
-    def code(self, line):
-        if not line:
-            return []
-
-        res = re.search(code_ptn, line)
-        if not res:
-            return self.strong_em(line)
-
-        children = []
-        d = res.groupdict()
-        children.extend(self.code(d['pre']))
-        children.append(code(children=self.handle_speci_char(d['text'])))
-        children.extend(self.code(d['post']))
-
-        return children
-
     def _li_leveled(self, line):
-
+        # One level per four leading spaces, or per leading tab.
         if line[0] == ' ':
-            level = 0
-            while True:
-                if line[level * 4:].startswith(' ' * 4):
-                    level += 1
-                else:
-                    break
+            level = (len(line) - len(line.lstrip(' '))) // 4
             return level, line[level * 4:]
 
         if line[0] == '\t':
-            level = 0
-            while line[level] == '\t' and level < len(line):
-                level += 1
+            level = len(line) - len(line.lstrip('\t'))
             return level, line[level:]
 
         return 0, line
 
-    def _list(self, lines, level=0):
-        children = []
-        if isinstance(lines[0], str):
-            leveled_lines = [self._li_leveled(line) for line in lines]
-        else:
-            leveled_lines = lines
-        lclass = ul
-        if re.search(ordered_list_ptn, leveled_lines[0][1]):
-            lclass = ol
-
-        idx = 0
-        pre_item = None
-        while idx < len(leveled_lines):
-            lv, value = leveled_lines[idx]
-            if lv > level:
-                ele, n_lines = self._list(lines=leveled_lines[idx:], level=lv)
-                if pre_item:
-                    pre_item.add_child(ele)
+    def _list_item(self, value):
+        title = list_re.search(value).group('title')
+        return li(children=_compact(self.code(title.strip())))
+
+    def _list(self, lines):
+        # Builds nested lists in one pass with a stack of open lists, one
+        # [level, element, last item] frame per nesting level. A deeper line
+        # opens a list inside the last item of the current one.
+        _, value = self._li_leveled(lines[0])
+        root = (ol if ordered_list_re.search(value) else ul)(children=[])
+        stack = [[0, root, None]]
+        for level, value in map(self._li_leveled, lines):
+            frame = stack[-1]
+            while level < frame[0]:
+                stack.pop()
+                frame = stack[-1]
+
+            if level > frame[0]:
+                lclass = ol if ordered_list_re.search(value) else ul
+                ele = lclass(children=[])
+                if frame[2] is not None:
+                    frame[2].add_child(ele)
                 else:
-                    children.append(li(children=[ele]))
-                idx += n_lines
-                continue
-            elif lv == level:
-                res = re.search(list_ptn, value)
-                ele = li(children=self.code(res.groupdict()['title'].strip()))
-                children.append(ele)
-                idx += 1
-                pre_item = ele
-            else:
-                break
+                    frame[1].add_child(li(children=[ele]))
+                frame = [level, ele, None]
+                stack.append(frame)
+
+            frame[2] = self._list_item(value)
+            frame[1].add_child(frame[2])
 
-        return lclass(children=children), idx
+        return root
 
-    def list(self, lines, start):
-        matched_lines, nstart = self._fetch_all_ptn(lines=lines,
-                                                    start=start,
-                                                    ptn=list_ptn)
+    def list(self, lines, start, kinds, ctx):
+        matched_lines, nstart = self._fetch_all(lines, start, kinds)
 
-        ele, _ = self._list(matched_lines)
-        return ele, nstart
+        return self._list(matched_lines), nstart
 
-    def hr(self, lines, start):
+    def hr(self, lines, start, kinds, ctx):
         ele = hr()
         return ele, start + 1
 
-    def keep_formula(self, line):
-        rem = re.search(single_line_math_latex_ptn, line)
-        if not rem:
-            return line
-
-        dct = rem.groupdict()
-        formula = dct['formula']
-        digest = hashlib.sha1(formula.encode()).hexdigest()
-        placeholder = f'###FML>{digest}<###'
-        self.forward_buffer[digest] = formula
-        return self.keep_formula(
-            dct["pre"]) + placeholder + self.unkeep_formula(dct["post"])
-
-    def unkeep_formula(self, line):
-        rem = re.search(formula_placement_ptn, line)
-        if not rem:
-            return line
-
-        res = rem.groupdict()
+    def table_cells(self, line):
+        # The text between consecutive pipes, where a pipe inside a formula
+        # does not count, e.g. `| $\pi(a|s)$ |` is one cell.
+        spans = _formula_spans(line, 0, len(line)) if '$' in line else ()
+        pipes = []
+        k = 0
+        i = line.find('|')
+        while i != -1:
+            while k < len(spans) and spans[k][1] <= i:
+                k += 1
+            if k < len(spans) and spans[k][0] < i:
+                i = line.find('|', spans[k][1])
+                continue
+            pipes.append(i)
+            i = line.find('|', i + 1)
 
-        return self.unkeep_formula(res['pre']) + \
-            '$' + \
-            self.forward_buffer[res['digest']] + \
-            '$' + \
-            self.unkeep_formula(res['post'])
+        return [
+            line[opening + 1:closing].strip()
+            for opening, closing in zip(pipes, pipes[1:])
+        ]
 
     def handle_td_line(self, line, aligns=None):
         tds = []
-        need_keep = False
-        if '$' in line:
-            need_keep = True
-            line = self.keep_formula(line)
-
-        for i, text in enumerate([
-                l.strip() for l in line.split('|')[1:-1]
-                # if l and not l.isspace()
-        ]):
+        for i, text in enumerate(self.table_cells(line)):
             align = 'center'
             if aligns is not None and i < len(aligns):
                 align = aligns[i]
             tds.append(
-                td(children=self.code(
-                    text if not need_keep else self.unkeep_formula(text)),
-                   attrs={'style': f'text-align: {align}'}))
+                td(children=_compact(self.code(text)),
+                   attrs=ALIGN_ATTRS[align]))
 
         return tr(children=tds)
 
+    def iter_td_lines(self, lines, aligns=None, cancel=None):
+        # Renders the same markup as handle_td_line, straight to text and
+        # TABLE_ROW_BATCH rows at a time, with the <td> tags built once.
+        # Rows render after parsing, so `cancel` is checked per batch too.
+        aligns = aligns or ()
+        tags = [f'<td style="text-align: {align}">' for align in aligns]
+        default = '<td style="text-align: center">'
+        ntags = len(tags)
+        code = self.code
+        batch = []
+        append = batch.append
+        for n, line in enumerate(lines, 1):
+            append('<tr>')
+            for i, text in enumerate(self.table_cells(line)):
+                append(tags[i] if i < ntags else default)
+                for child in code(text):
+                    if child.__class__ is str:
+                        append(child)
+                    else:
+                        batch.extend(child.iter_render())
+                append('</td>')
+            append('</tr>')
+            if n % TABLE_ROW_BATCH == 0:
+                if cancel is not None and cancel.is_set():
+                    raise ConvertCancelled()
+                yield ''.join(batch)
+                batch.clear()
+
+        if batch:
+            yield ''.join(batch)
+
     def handle_th_line(self, line, aligns=None):
         ths = []
-        for i, text in enumerate([
-                l.strip()
-                for l in line.split('|')[1:-1]
-                if l and not l.isspace()
-        ]):
+        for i, text in enumerate(
+            [text for text in self.table_cells(line) if text]):
             align = 'center'
             if aligns is not None and i < len(aligns):
                 align = aligns[i]
             ths.append(
-                th(children=self.code(text),
-                   attrs={'style': f'text-align: {align}'}))
+                th(children=_compact(self.code(text)),
+                   attrs=ALIGN_ATTRS[align]))
 
         return tr(children=ths)
 
@@ -492,32 +803,30 @@ class Markdown(object):
 
         return 'center'
 
-    def table(self, lines, start):
-        table_lines, nstart = self._fetch_all_ptn(lines=lines,
-                                                  start=start,
-                                                  ptn=tr_line_filter)
+    def table(self, lines, start, kinds, ctx):
+        table_lines, nstart = self._fetch_all(lines, start, kinds)
+        cancel = ctx.cancel if ctx is not None else None
         if len(table_lines) == 1:
-            return table(children=[
-                tbody(children=[self.handle_td_line(line=table_lines[0])])
-            ])
-
-        ele = table(children=[])
-        if ':' in table_lines[1]:
-            aligns = [
-                self.table_align(l.strip())
-                for l in table_lines[1].split('|')[1:-1]
-                if l and not l.isspace()
-            ]
-            ele.add_child(
-                thead(children=self.handle_th_line(table_lines[0],
-                                                   aligns=aligns)))
-            ele_body = tbody(children=[])
-            for line in table_lines[2:]:
-                ele_body.add_child(
-                    child=self.handle_td_line(line, aligns=aligns))
-            ele.add_child(ele_body)
-
-        return ele, nstart
+            return streamed_table(head=None,
+                                  rows=partial(self.iter_td_lines,
+                                               table_lines,
+                                               cancel=cancel)), nstart
+
+        if ':' not in table_lines[1]:
+            return table(children=[]), nstart
+
+        aligns = [
+            self.table_align(l.strip())
+            for l in table_lines[1].split('|')[1:-1]
+            if l and not l.isspace()
+        ]
+        head = thead(
+            children=self.handle_th_line(table_lines[0], aligns=aligns))
+        rows = partial(self.iter_td_lines,
+                       table_lines[2:],
+                       aligns,
+                       cancel=cancel)
+        return streamed_table(head=head, rows=rows), nstart
 
     def handle_speci_in_latex(self, text):
         return text.replace('<', '\\lt').replace('>', '\\gt')
@@ -525,120 +834,399 @@ class Markdown(object):
     def handle_speci_char(self, text):
         return text.replace('<', '&lt;').replace('>', '&gt;')
 
-    def code_block(self, lines, start):
-        res = re.search(code_block_open_ptn, lines[start])
-        d = res.groupdict()
-        language = d['language']
-        start += 1
-        matched_lines, nstart = self._fetch_all_until(lines,
-                                                      start,
-                                                      ptn=code_block_close_ptn)
-        if matched_lines and re.search(code_block_close_ptn,
-                                       matched_lines[-1]):
+    def code_block(self, lines, start, kinds, ctx):
+        language = code_block_open_re.search(lines[start]).group('language')
+        matched_lines, nstart = self._fetch_all_until(lines, start, kinds,
+                                                      code_block_close_re)
+        if matched_lines is not None:
             ele = hlcode(codes=os.linesep.join(
-                [self.handle_speci_char(l) for l in matched_lines[:-1]]),
+                [self.handle_speci_char(l) for l in matched_lines]),
                          language=language)
             return ele, nstart
 
-        return p(children=matched_lines[0]), start
+        return p(children=lines[start]), nstart
 
-    def math_latex(self, lines, start):
-        start += 1
-        matched_lines, nstart = self._fetch_all_until(lines,
-                                                      start,
-                                                      ptn=math_latex_ptn)
-        if matched_lines and re.search(math_latex_ptn, matched_lines[-1]):
+    def math_latex(self, lines, start, kinds, ctx):
+        matched_lines, nstart = self._fetch_all_until(lines, start, kinds,
+                                                      math_latex_re)
+        if matched_lines is not None:
             formula = os.linesep.join(
-                [self.handle_speci_in_latex(l) for l in matched_lines[:-1]])
+                [self.handle_speci_in_latex(l) for l in matched_lines])
             children = f'$${os.linesep}{formula}{os.linesep}$${os.linesep}'
             ele = div(children=children, attrs={'class': 'math-formula'})
 
             return ele, nstart
 
-        return p(children=matched_lines[0]), start
+        return p(children=lines[start]), nstart
+
+    def block_handlers(self):
+        handlers = {
+            ext.kind: self._bind(ext.handler)
+            for ext in self.extensions.blocks
+        }
+        handlers[LINE_TEXT] = self.p
+        return handlers
+
+    def _bind(self, func):
+        # The built-in extensions name their method, so subclasses that
+        # override it are dispatched to.
+        if isinstance(func, str):
+            return getattr(self, func)
+        return MethodType(func, self)
+
+    def handle_element(self, lines, start, kinds, ctx):
+        kind = kinds[start]
+        if kind == LINE_BLANK:
+            return '', start + 1
 
-    def handle_element(self, lines, start):
+        return self._handlers[kind](lines, start, kinds, ctx)
 
-        if not lines[start] or lines[start].isspace():
-            return '', start + 1
+    def split_blocks(self, lines):
+        # Group an iterable of lines into top-level blocks, reading only one
+        # line past the end of each block, so it also works on file objects
+        # without holding the whole document.
+        rules = self._line_rules
+        closers = self._fence_closers
+        source = iter(lines)
+        while True:
+            block, kinds = [], bytearray()
+            for line in source:
+                kind = classify_line(line, rules)
+                if block:
+                    if kinds[0] in closers:
+                        block.append(line)
+                        kinds.append(kind)
+                        if kind == kinds[0] and closers[kind].search(line):
+                            yield block, kinds
+                            block, kinds = [], bytearray()
+                        continue
+
+                    if _continues_block(kinds[0], line, kind,
+                                        self._run_kinds):
+                        block.append(line)
+                        kinds.append(kind)
+                        continue
+
+                    yield block, kinds
+                    block, kinds = [], bytearray()
+
+                block.append(line)
+                kinds.append(kind)
+                if kind in self._line_kinds:
+                    yield block, kinds
+                    block, kinds = [], bytearray()
+
+            if not block:
+                return
+
+            if kinds[0] not in closers:
+                yield block, kinds
+                return
+
+            # An unclosed fence only contributes its opening line, then the
+            # lines after it are split again.
+            yield block[:1], kinds[:1]
+            source = iter(block[1:])
+
+    def iter_elements(self, lines, ctx):
+        for block, kinds in self.split_blocks(lines):
+            if ctx.cancel is not None and ctx.cancel.is_set():
+                raise ConvertCancelled()
+
+            yield from self.memoized_elements(block, kinds, ctx)
+
+    def memoized_elements(self, block, kinds, ctx):
+        if self.block_cache is None or not self.memoizable(block, kinds):
+            yield from self.block_elements(block, kinds, ctx)
+            return
 
-        if re.search(hr_ptn, lines[start]):
-            return self.hr(lines, start)
+        key = (self._block_options, kinds[0], '\n'.join(block))
+        html = self.block_cache.get(key)
+        if html is None:
+            html = ''.join(
+                self.iter_render(self.block_elements(block, kinds, ctx)))
+            self.block_cache.put(key, html)
+        yield html
 
-        if lines[start].startswith('#'):
-            return self.header(lines, start)
+    def block_elements(self, block, kinds, ctx):
+        start = 0
+        while start < len(block):
+            ele, start = self.handle_element(block, start, kinds, ctx)
+            yield ele
+
+    def memoizable(self, block, kinds):
+        # Headers and quotes (which may hold headers) feed the directory
+        # when headers are recorded, so their output depends on more than
+        # their own source.
+        kind = kinds[0]
+        if kind == LINE_BLANK or len(block) > BLOCK_CACHE_MAX_LINES:
+            return False
+
+        return not (self.recording_headers and
+                    kind in (LINE_HEADER, LINE_QUOTE))
+
+    def directory_element(self, ctx):
+        return directory_element(ctx.dir_root, self.directory_title)
+
+    def directory(self, ctx):
+        ele = self.directory_element(ctx)
+        if ele is None:
+            return []
 
-        if lines[start].startswith('>'):
-            return self.blockquote(lines, start)
+        return [ele, hr()]
 
-        if re.search(list_ptn, lines[start]):
-            return self.list(lines, start)
+    def outline(self, textlines, ctx=None):
+        # Registers headers exactly as convert() with recording_headers
+        # would, but only looks at header blocks (quotes included), so
+        # fenced code and math are skipped and nothing is rendered.
+        if ctx is None:
+            ctx = ConvertContext()
+        if isinstance(textlines, str):
+            textlines = textlines.split(os.linesep)
+
+        stack = [self.split_blocks(textlines)]
+        while stack:
+            for block, kinds in stack[-1]:
+                if kinds[0] == LINE_HEADER:
+                    self.header_anchor(block[0], ctx, True)
+                elif kinds[0] == LINE_QUOTE:
+                    stack.append(self._quote_blocks(block))
+                    break
+            else:
+                stack.pop()
+
+        return ctx.dir_root
+
+    def scan(self, textlines, ctx=None):
+        # Collects what convert() would render as headings, links, images
+        # and formulas, using the same block splitting and inline
+        # recognizers but without building elements. Emphasis is not
+        # resolved, so a link is found even where emphasis markers would
+        # cut through it in the HTML, and inline extensions other than the
+        # built-in code spans and formulas are not consulted.
+        if ctx is None:
+            ctx = ConvertContext()
+        if isinstance(textlines, str):
+            textlines = textlines.split(os.linesep)
+
+        headings, links, images = [], [], []
+        formulas = [0, 0]
+        stack = [self.split_blocks(textlines)]
+        while stack:
+            for block, kinds in stack[-1]:
+                kind = kinds[0]
+                if kind == LINE_QUOTE:
+                    stack.append(self._quote_blocks(block))
+                    break
 
-        if re.search(tr_line_filter, lines[start]):
-            return self.table(lines, start)
+                if kind == LINE_HEADER:
+                    level, title, attrs = self.header_anchor(
+                        block[0], ctx, self.recording_headers)
+                    headings.append(
+                        Heading(level, title.strip(), attrs.get('id')))
+                elif kind == LINE_MATH:
+                    # An unclosed fence comes back as its opening line only.
+                    if len(block) > 1:
+                        formulas[1] += 1
+                elif kind == LINE_TABLE:
+                    for text in self._scan_table_cells(block):
+                        self._scan_inline(text, links, images, formulas)
+                elif kind in (LINE_TEXT, LINE_LIST):
+                    for line in block:
+                        self._scan_inline(line.strip(), links, images,
+                                          formulas)
+            else:
+                stack.pop()
 
-        if re.search(code_block_open_ptn, lines[start]):
-            return self.code_block(lines, start)
+        return Metadata(headings, links, images, formulas[0], formulas[1])
 
-        if re.search(math_latex_ptn, lines[start]):
-            return self.math_latex(lines, start)
+    def _scan_table_cells(self, lines):
+        if len(lines) == 1:
+            return self.table_cells(lines[0])
 
-        if lines[start] and lines[start][0] and lines[start][0]:
-            return self.p(lines, start)
+        if ':' not in lines[1]:
+            return []
 
-        self._show(lines[start], name='This should not happend!')
-        return lines[start], start + 1
+        cells = self.table_cells(lines[0])
+        for line in lines[2:]:
+            cells.extend(self.table_cells(line))
+        return cells
+
+    def _scan_inline(self, line, links, images, formulas):
+        lo = 0
+        if 'code' in self._inline_names:
+            for opening, closing in _code_spans(line, 0, len(line)):
+                self._scan_text(line, lo, opening, links, images, formulas)
+                lo = closing + 1
+        self._scan_text(line, lo, len(line), links, images, formulas)
+
+    def _scan_text(self, line, lo, hi, links, images, formulas):
+        if 'math' in self._inline_names and line.find('$', lo, hi) != -1:
+            for opening, closing in _formula_spans(line, lo, hi):
+                self._scan_links(line, lo, opening, links, images)
+                formulas[line.startswith('$$', opening)] += 1
+                lo = closing
+        self._scan_links(line, lo, hi, links, images)
+
+    def _scan_links(self, line, lo, hi, links, images):
+        # Mirrors _img and _a: images first, then links over the text with
+        # each image standing in as its alt text.
+        pieces = []
+        i = line.find('![', lo, hi)
+        while i != -1:
+            res = img_re.match(line, i, hi)
+            if not res:
+                i = line.find('![', i + 1, hi)
+                continue
 
-    def convert(self, textlines, final=False):
-        start = 0
-        children = []
+            d = res.groupdict()
+            attrs = {}
+            if d['attrs']:
+                attrs = dict(img_attr_re.findall(d['attrs'][1:-1]))
+            images.append(Image(d['src'], d['alt'], d['title'], attrs))
+            pieces.append(line[lo:i])
+            pieces.append(d['alt'])
+            lo = res.end()
+            i = line.find('![', lo, hi)
+
+        if pieces:
+            pieces.append(line[lo:hi])
+            line = ''.join(pieces)
+            lo, hi = 0, len(line)
+
+        i = line.find('[', lo, hi)
+        while i != -1:
+            res = None
+            if i == lo or line[i - 1] != '!':
+                res = link_re.match(line, i, hi)
+            if not res:
+                i = line.find('[', i + 1, hi)
+                continue
+
+            links.append(Link(res.group('text'), link_href(res.group('href'))))
+            lo = res.end()
+            i = line.find('[', lo, hi)
+
+    def outline_html(self, textlines):
+        ctx = ConvertContext()
+        self.outline(textlines, ctx)
+        ele = self.directory_element(ctx)
+        return '' if ele is None else f'{ele}'
+
+    def parse(self, textlines, ctx=None):
+        # The document is parsed once and can then be rendered, with or
+        # without a directory, or serialized with Document.to_bytes(). Lazy
+        # blocks such as streamed tables are rendered here, so that work is
+        # not redone per render and the document keeps no hold on ctx.
+        if ctx is None:
+            ctx = ConvertContext()
+
+        return self._document(textlines, ctx, lazy=False)
+
+    def _document(self, textlines, ctx, lazy=True):
         if isinstance(textlines, str):
             lines = textlines.split(os.linesep)
         else:
             lines = textlines
 
-        while True:
-            if start >= len(lines):
-                break
-            ele, nstart = self.handle_element(lines, start)
-            start = nstart
-            children += [ele]
-
-        cs = []
-        dir_children = []
-        if final and self.recording_headers:
-            items = []
-            title_p = p(children=self.directory_title)
-            if self.directory_title:
-                items.append(title_p)
-
-            dire = self.dir_root.build_node()
-            if self.dir_root.text:
-                items.append(dire)
-                dir_children.append(
-                    div(children=items,
-                        attrs={
-                            'id': 'article-directory',
-                            'class': 'article-directory'
-                        }))
-            else:
-                items.extend(dire.children)
-                dir_children.append(
-                    div(children=items,
-                        attrs={
-                            'id': 'article-directory',
-                            'class': 'article-directory'
-                        }))
-
-            dir_children.append(hr())
-
-        children = dir_children + children
-        for c in children:
-            s = f'{c}'
-            if not s:
-                continue
-            cs.append(s)
-        return os.linesep.join(cs)
+        blocks = list(self.iter_elements(lines, ctx))
+        if not lazy:
+            blocks = [
+                ''.join(ele.iter_render()) if getattr(ele, 'lazy', False)
+                else ele for ele in blocks
+            ]
+        return Document(blocks, ctx.dir_root)
+
+    def _options(self, final=False):
+        return (bool(self.recording_headers), self.directory_title,
+                bool(final and self.recording_headers), self.header_ids)
+
+    def _extension_key(self, ext):
+        # A handler or stage stands for the function it resolves to here,
+        # so a subclass override or a replaced function changes the key.
+        func = self._bind(getattr(ext, 'handler', None) or ext.stage)
+        func = getattr(func, '__func__', func)
+        fields = ext._asdict()
+        fields['handler' if 'handler' in fields else 'stage'] = (
+            f'{getattr(func, "__module__", None)}.'
+            f'{getattr(func, "__qualname__", repr(func))}')
+        for name in ('pattern', 'close'):
+            pattern = fields.get(name)
+            if pattern is not None:
+                fields[name] = (getattr(pattern, 'pattern', repr(pattern)),
+                                getattr(pattern, 'flags', 0))
+        return tuple(fields.items())
+
+    def cache_options(self, final=False):
+        return self._options(final) + (self._extensions_key, )
+
+    def convert(self, textlines, final=False, ctx=None, cancel=None):
+        # A caller-supplied ctx carries headers across the parts of one
+        # document, so its output is not a function of textlines alone.
+        key = None
+        if self.cache is not None and ctx is None and isinstance(
+                textlines, str):
+            key = self.cache.key(textlines, self.cache_options(final))
+            html = self.cache.get(key)
+            if html is not None:
+                return html
+
+        if ctx is None:
+            ctx = ConvertContext(cancel=cancel)
+        elif cancel is not None:
+            ctx.cancel = cancel
+
+        # Rendered once, so lazy blocks stay lazy.
+        html = self._document(textlines, ctx).render(
+            toc=bool(final and self.recording_headers),
+            directory_title=self.directory_title)
+        if key is not None:
+            self.cache.put(key, html)
+
+        return html
+
+    def convert_iter(self,
+                     fin,
+                     final=False,
+                     spool_size=SPOOL_SIZE,
+                     ctx=None):
+        # Files opened with newline='' keep '\r\n' endings; both parts are
+        # dropped, as MappedLines does.
+        lines = (_chomp(line) for line in fin)
+        return self.convert_lines(lines, final, spool_size, ctx)
+
+    def convert_lines(self,
+                      lines,
+                      final=False,
+                      spool_size=SPOOL_SIZE,
+                      ctx=None):
+        if ctx is None:
+            ctx = ConvertContext()
+
+        body = self.iter_render(self.iter_elements(lines, ctx))
+        if not (final and self.recording_headers):
+            yield from body
+            return
+
+        yield from directory_first(body, partial(self.directory, ctx),
+                                   spool_size)
+
+    def convert_file(self, path, out_path, final=False, encoding='utf-8'):
+        # The input is memory-mapped and decoded a line at a time, or read
+        # as text in encodings such as utf-16 where lines cannot be cut on
+        # bytes. The output is written with write_atomic.
+        from new_markdown.mapped import MappedLines, newline_compatible
+
+        if newline_compatible(encoding):
+            with MappedLines(path, encoding) as lines:
+                write_atomic(out_path, self.convert_lines(lines, final),
+                             encoding)
+        else:
+            with open(path, 'r', encoding=encoding) as fin:
+                write_atomic(out_path, self.convert_iter(fin, final), encoding)
+
+    def iter_render(self, children):
+        return iter_render(children)
 
     def __call__(self, textlines):
         return self.convert(textlines)
@@ -647,3 +1235,60 @@ class Markdown(object):
         print('=' * 20, f' {name} ', '=' * 20)
         print(text)
         print('=' * 20, f' {name} ', '=' * 20, flush=True)
+
+
+def default_extensions():
+    # The built-in syntax. Remove entries, e.g. remove('table', 'math'), for
+    # content that never uses them.
+    registry = Registry()
+    registry.add_block('hr',
+                       '*-',
+                       'hr',
+                       hr_re,
+                       priority=10,
+                       kind=LINE_HR)
+    registry.add_block('header', '#', 'header', kind=LINE_HEADER)
+    registry.add_block('quote',
+                       '>',
+                       'blockquote',
+                       layout=RUN,
+                       kind=LINE_QUOTE)
+    registry.add_block('list', ('-', '+', '.', INDENTED),
+                       'list',
+                       list_re,
+                       layout=RUN,
+                       kind=LINE_LIST)
+    registry.add_block('table',
+                       '|',
+                       'table',
+                       tr_line_re,
+                       layout=RUN,
+                       kind=LINE_TABLE)
+    registry.add_block('code',
+                       '`',
+                       'code_block',
+                       code_block_open_re,
+                       layout=FENCE,
+                       close=code_block_close_re,
+                       kind=LINE_CODE)
+    registry.add_block('math',
+                       '$',
+                       'math_latex',
+                       math_latex_re,
+                       layout=FENCE,
+                       close=math_latex_re,
+                       kind=LINE_MATH)
+
+    # Code spans come first so nothing inside them is rendered, then
+    # formulas, which are kept as they are for MathJax.
+    registry.add_inline('code', '`', '_code', priority=70)
+    registry.add_inline('math', '$', '_math', priority=60)
+    registry.add_inline('strong_em', '*', '_strong_em', priority=50)
+    registry.add_inline('strong', '*', '_strong', priority=40)
+    registry.add_inline('em', '*', '_em', priority=30)
+    registry.add_inline('img', '!', '_img', priority=20)
+    registry.add_inline('a', '[', '_a', priority=10)
+    return registry
+
+
+LINE_RULES = default_extensions().line_rules()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import marshal
+import os
+
+from new_markdown.elements import Element
+from new_markdown.elements import a, div, hr, li, ol, p, ul
+
+# Bump when the encoded layout changes; older payloads are rejected.
+DOCUMENT_VERSION = 1
+
+
+class DirNode(object):
+
+    def __init__(self, level, link, text, children, parent):
+        self.level = level
+        self.link = link
+        self.text = text
+        self.children = children
+        self.parent = parent
+
+    def build_node(self, list_type='ol'):
+        ele = li(children=[])
+        if self.text:
+            ele.add_child(a(text=self.text, href=f'#{self.link}'))
+
+        if self.children:
+            children = [child.build_node(list_type) for child in self.children]
+            ele.add_child((ul if list_type == 'ul' else ol)(children=children))
+
+        return ele
+
+    def as_dict(self):
+        return {
+            'level': self.level,
+            'id': self.link,
+            'text': self.text,
+            'children': [child.as_dict() for child in self.children],
+        }
+
+    def show(self, depth=1):
+        print('->', '    ' * depth, f'{self}')
+        for child in self.children:
+            child.show(depth + 1)
+
+    def __str__(self):
+        return f'{self.level} - {self.link} - {self.text}'
+
+
+def directory_element(root, title=None):
+    if not root.children:
+        return None
+
+    items = []
+    if title:
+        items.append(p(children=title))
+
+    if len(root.children) == 1:
+        items.append(root.children[0].build_node())
+    else:
+        items.append(ol(children=[child.build_node()
+                                  for child in root.children]))
+
+    return div(children=items,
+               attrs={
+                   'id': 'article-directory',
+                   'class': 'article-directory'
+               })
+
+
+def iter_render(children):
+    sep = ''
+    for child in children:
+        if isinstance(child, Element):
+            yield sep
+            yield from child.iter_render()
+        else:
+            text = f'{child}'
+            if not text:
+                continue
+            yield sep
+            yield text
+        sep = os.linesep
+
+
+def encode_blocks(blocks):
+    # Element trees are flattened in preorder: a str stands for itself and
+    # an element for (tag_name, with_closing, attrs, number of children),
+    # followed by its children. Lazy elements are stored as rendered text.
+    # The result is flat, so marshal never meets deep nesting.
+    out = []
+    stack = list(reversed(blocks))
+    while stack:
+        node = stack.pop()
+        if node.__class__ is str:
+            out.append(node)
+        elif not isinstance(node, Element):
+            out.append(f'{node}')
+        elif node.lazy:
+            out.append(''.join(node.iter_render()))
+        else:
+            attrs = dict(node.attrs) if node.attrs else None
+            children = node.children
+            if not children:
+                children = ()
+            elif children.__class__ is str:
+                children = (children, )
+            out.append((node.tag_name, node.with_closing, attrs,
+                        len(children)))
+            stack.extend(reversed(children))
+
+    return out
+
+
+def decode_blocks(items, count):
+    # Rebuilds `count` top-level nodes from encode_blocks output, with a
+    # stack of [element, children still expected] frames.
+    blocks = []
+    stack = []
+    for item in items:
+        if item.__class__ is str:
+            node = item
+        else:
+            tag_name, with_closing, attrs, nchildren = item
+            node = Element(tag_name=tag_name,
+                           with_closing=with_closing,
+                           attrs=attrs,
+                           children=[] if nchildren else None)
+
+        if stack:
+            frame = stack[-1]
+            frame[0].children.append(node)
+            frame[1] -= 1
+        else:
+            blocks.append(node)
+
+        if node.__class__ is not str and nchildren:
+            stack.append([node, nchildren])
+        while stack and not stack[-1][1]:
+            ele = stack.pop()[0]
+            if len(ele.children) == 1 and ele.children[0].__class__ is str:
+                ele.children = ele.children[0]
+
+    assert len(blocks) == count
+    return blocks
+
+
+def encode_outline(root):
+    out = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        out.append((node.level, node.link, node.text, len(node.children)))
+        stack.extend(reversed(node.children))
+    return out
+
+
+def decode_outline(items):
+    root = None
+    stack = []
+    for level, link, text, nchildren in items:
+        parent = stack[-1][0] if stack else None
+        node = DirNode(level=level,
+                       link=link,
+                       text=text,
+                       children=[],
+                       parent=parent)
+        if parent is None:
+            root = node
+        else:
+            parent.children.append(node)
+            stack[-1][1] -= 1
+
+        if nchildren:
+            stack.append([node, nchildren])
+        while stack and not stack[-1][1]:
+            stack.pop()
+
+    return root
+
+
+class Document(object):
+    # The result of Markdown.parse: top-level blocks plus the header
+    # outline, renderable any number of times with different options.
+
+    def __init__(self, blocks, outline) -> None:
+        super().__init__()
+        self.blocks = blocks
+        self.outline = outline
+
+    def directory(self, title=None):
+        ele = directory_element(self.outline, title)
+        if ele is None:
+            return []
+
+        return [ele, hr()]
+
+    def iter_render(self, toc=False, directory_title=None):
+        if not toc:
+            return iter_render(self.blocks)
+
+        return iter_render(self.directory(directory_title) + self.blocks)
+
+    def render(self, toc=False, directory_title=None):
+        return ''.join(self.iter_render(toc, directory_title))
+
+    def to_bytes(self):
+        return marshal.dumps(
+            (DOCUMENT_VERSION, len(self.blocks), encode_blocks(self.blocks),
+             encode_outline(self.outline)))
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, count, blocks, outline = marshal.loads(data)
+        if version != DOCUMENT_VERSION:
+            raise ValueError(f'Unsupported document version: {version}')
+
+        return cls(decode_blocks(blocks, count), decode_outline(outline))
@@ -1,7 +1,24 @@
 # -*- coding: utf-8 -*-
+from types import MappingProxyType
+
+TABLE_ATTRS = MappingProxyType({'class': 'table'})
+
+
+def link_href(href):
+    if href.startswith('http') or href.startswith('/') \
+            or href.startswith('#'):
+        return href
+
+    return f'http://{href}'
 
 
 class Element(object):
+    # `attrs` may be a shared read-only mapping (see add_attr) and
+    # `children` is None, a single str or a list.
+    __slots__ = ('tag_name', 'with_closing', 'attrs', 'children')
+    # Lazy elements produce their own fragments in iter_render(), which the
+    # tree walk below delegates to.
+    lazy = False
 
     def __init__(self,
                  tag_name='',
@@ -11,7 +28,8 @@ class Element(object):
         self.tag_name = tag_name
         self.with_closing = with_closing
         self.attrs = attrs
-        if not isinstance(children, list):
+        if children is not None and children.__class__ is not str and \
+                not isinstance(children, list):
             children = [children]
         self.children = children
 
@@ -25,43 +43,77 @@ class Element(object):
         self.attrs = attrs
 
     def add_attr(self, name, value):
-        if not self.attrs:
-            self.attrs = {}
+        # Copy on write, so one attribute map can back many elements.
+        if self.attrs.__class__ is not dict:
+            self.attrs = dict(self.attrs or ())
 
         self.attrs[name] = value
 
     def add_child(self, child):
-        if not self.children:
-            self.children = []
-
-        self.children.append(child)
-
-    def __str__(self):
-        text = ''
-        if self.tag_name:
-            text += f'<{self.tag_name}'
-
-        if self.attrs:
-            for name, value in self.attrs.items():
-                text += f' {name}="{value}"'
+        children = self.children
+        if not children:
+            self.children = [child]
+        elif children.__class__ is str:
+            self.children = [children, child]
+        else:
+            children.append(child)
 
-        if not self.with_closing:
+    def open_tag(self):
+        text = f'<{self.tag_name}' if self.tag_name else ''
+        if not self.attrs:
             return f'{text}>'
 
-        text += '>'
-        if self.children:
-            if isinstance(self.children, str):
-                text += self.children
+        return text + ''.join(
+            [f' {name}="{value}"' for name, value in self.attrs.items()]) + '>'
+
+    def iter_render(self):
+        # Depth-first walk with an explicit stack, so deep trees do not hit
+        # the recursion limit. Closing tags are pushed as plain strings and
+        # elements with a single text child are emitted as one fragment.
+        stack = [self]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node = pop()
+            if node.__class__ is str:
+                yield node
+                continue
+
+            if not isinstance(node, Element):
+                yield f'{node}'
+                continue
+
+            if node.lazy and node is not self:
+                yield from node.iter_render()
+                continue
+
+            text = node.open_tag()
+            if not node.with_closing:
+                yield text
+                continue
+
+            children = node.children
+            closing = f'</{node.tag_name}>'
+            if not children:
+                yield text + closing
+            elif children.__class__ is str:
+                yield text + children + closing
+            elif len(children) == 1 and children[0].__class__ is str:
+                yield text + children[0] + closing
             else:
-                for child in self.children:
-                    text += f'{child}'
+                yield text
+                push(closing)
+                stack.extend(reversed(children))
 
-        text += f'</{self.tag_name}>'
+    def render(self, out):
+        out.writelines(self.iter_render())
 
-        return text
+    def __str__(self):
+        return ''.join(self.iter_render())
 
 
 class h1(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='h1',
@@ -71,6 +123,7 @@ class h1(Element):
 
 
 class h2(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='h2',
@@ -80,6 +133,7 @@ class h2(Element):
 
 
 class h3(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='h3',
@@ -89,6 +143,7 @@ class h3(Element):
 
 
 class h4(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='h4',
@@ -98,6 +153,7 @@ class h4(Element):
 
 
 class h5(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='h5',
@@ -107,6 +163,7 @@ class h5(Element):
 
 
 class h6(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='h6',
@@ -116,6 +173,7 @@ class h6(Element):
 
 
 class p(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='p',
@@ -125,6 +183,7 @@ class p(Element):
 
 
 class div(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='div',
@@ -134,6 +193,7 @@ class div(Element):
 
 
 class em(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='em',
@@ -143,6 +203,7 @@ class em(Element):
 
 
 class strong(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='strong',
@@ -152,6 +213,7 @@ class strong(Element):
 
 
 class blockquote(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='blockquote',
@@ -161,6 +223,7 @@ class blockquote(Element):
 
 
 class ol(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='ol',
@@ -170,6 +233,7 @@ class ol(Element):
 
 
 class li(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='li',
@@ -179,6 +243,7 @@ class li(Element):
 
 
 class ul(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='ul',
@@ -188,6 +253,7 @@ class ul(Element):
 
 
 class code(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='code',
@@ -197,26 +263,24 @@ class code(Element):
 
 
 class hr(Element):
+    __slots__ = ()
 
     def __init__(self, attrs=None):
         super().__init__(tag_name='hr', with_closing=False, attrs=attrs)
 
 
 class a(Element):
+    __slots__ = ()
 
     def __init__(self, text, href):
-        if href.startswith('http') or href.startswith('/') \
-                or href.startswith('#'):
-            href = href
-        else:
-            href = f'http://{href}'
         super().__init__(tag_name='a',
                          with_closing=True,
-                         attrs={'href': href},
+                         attrs={'href': link_href(href)},
                          children=text)
 
 
 class pre(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='pre',
@@ -226,6 +290,7 @@ class pre(Element):
 
 
 class img(Element):
+    __slots__ = ()
 
     def __init__(self, src, **extras):
         attrs = {'src': src}
@@ -234,6 +299,7 @@ class img(Element):
 
 
 class hlcode(Element):
+    __slots__ = ()
 
     def __init__(self, codes, language=None, attrs=None):
         if attrs is None:
@@ -248,13 +314,13 @@ class hlcode(Element):
 
 
 class table(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
-        _attrs = {'class': 'table'}
         if attrs is None:
-            attrs = _attrs
+            attrs = TABLE_ATTRS
         else:
-            attrs.update(_attrs)
+            attrs = dict(attrs, **TABLE_ATTRS)
 
         super().__init__(tag_name='table',
                          with_closing=True,
@@ -262,7 +328,28 @@ class table(Element):
                          children=children)
 
 
+class streamed_table(table):
+    # A table whose body is not held as a tree: `rows` is called on every
+    # render and yields the HTML of the tbody content in chunks.
+    __slots__ = ('head', 'rows')
+    lazy = True
+
+    def __init__(self, head, rows, attrs=None):
+        super().__init__(children=None, attrs=attrs)
+        self.head = head
+        self.rows = rows
+
+    def iter_render(self):
+        yield self.open_tag()
+        if self.head is not None:
+            yield from self.head.iter_render()
+        yield '<tbody>'
+        yield from self.rows()
+        yield '</tbody></table>'
+
+
 class thead(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='thead',
@@ -272,6 +359,7 @@ class thead(Element):
 
 
 class tbody(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='tbody',
@@ -281,6 +369,7 @@ class tbody(Element):
 
 
 class tr(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='tr',
@@ -290,6 +379,7 @@ class tr(Element):
 
 
 class th(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='th',
@@ -299,6 +389,7 @@ class th(Element):
 
 
 class td(Element):
+    __slots__ = ()
 
     def __init__(self, children, attrs=None):
         super().__init__(tag_name='td',
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+# How a block extension's lines are grouped: LINE blocks are one line, RUN
+# blocks take the following lines of the same kind, and FENCE blocks run up
+# to the next line of their kind matching `close`. An unclosed fence is its
+# opening line alone.
+LINE = 'line'
+RUN = 'run'
+FENCE = 'fence'
+LAYOUTS = (LINE, RUN, FENCE)
+
+# As a block trigger, stands for every line starting with whitespace or a
+# decimal digit (indented and numbered list items).
+INDENTED = ''
+
+# Kinds below FIRST_KIND belong to the built-in blocks. A document's kinds
+# are kept in a bytearray, so they stop at MAX_KIND.
+FIRST_KIND = 16
+MAX_KIND = 255
+
+BlockExtension = namedtuple('BlockExtension', [
+    'name', 'kind', 'triggers', 'pattern', 'handler', 'priority', 'layout',
+    'close'
+])
+InlineExtension = namedtuple('InlineExtension',
+                             ['name', 'triggers', 'stage', 'priority'])
+
+
+def _triggers(triggers):
+    triggers = tuple(dict.fromkeys(triggers))
+    for char in triggers:
+        if not isinstance(char, str) or len(char) > 1:
+            raise ValueError(f'Triggers must be single characters: {char!r}')
+    return triggers
+
+
+class Registry(object):
+    # The block and inline rules a Markdown dispatches to.
+    #
+    # A block extension is tried only on lines whose first character is one
+    # of its triggers: its pattern (None to accept every such line) decides
+    # whether the line is of its kind, and rules sharing a trigger are tried
+    # by descending priority. Its handler is called as
+    # handler(md, lines, start, kinds, ctx) and returns (element, next_start)
+    # like the built-in block methods.
+    #
+    # An inline extension is a stage of the inline pipeline, called as
+    # stage(md, line, lo, hi, out, nxt). It appends what it renders of
+    # line[lo:hi] to out and passes every other part on to nxt, the stages
+    # of lower priority. Stages whose triggers do not occur in a line are
+    # left out of that line's pipeline.
+    #
+    # A handler or stage may also be the name of a Markdown method, which is
+    # looked up on each instance so subclasses can override it; the built-in
+    # extensions are registered this way.
+    #
+    # Registries compare by value, so equal ones can share cached Markdowns.
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.blocks = ()
+        self.inlines = ()
+
+    def add_block(self,
+                  name,
+                  triggers,
+                  handler,
+                  pattern=None,
+                  priority=0,
+                  layout=LINE,
+                  close=None,
+                  kind=None):
+        if any(ext.name == name for ext in self.blocks):
+            raise ValueError(f'Block extension already registered: {name}')
+        if layout not in LAYOUTS:
+            raise ValueError(f'Unknown block layout: {layout}')
+        if (layout == FENCE) != (close is not None):
+            raise ValueError('A closing pattern is required by, and only by, '
+                             'the fence layout')
+
+        if kind is None:
+            kind = max([FIRST_KIND - 1] + [ext.kind for ext in self.blocks]) + 1
+            if kind > MAX_KIND:
+                raise ValueError('Too many block extensions')
+
+        self.blocks += (BlockExtension(name, kind, _triggers(triggers),
+                                       pattern, handler, priority, layout,
+                                       close), )
+        return kind
+
+    def add_inline(self, name, triggers, stage, priority=0):
+        if any(ext.name == name for ext in self.inlines):
+            raise ValueError(f'Inline extension already registered: {name}')
+        triggers = _triggers(triggers)
+        if not triggers or INDENTED in triggers:
+            raise ValueError('Inline extensions need trigger characters')
+
+        self.inlines += (InlineExtension(name, triggers, stage, priority), )
+
+    def remove(self, *names):
+        # A name may cover both a block and an inline extension, e.g. math.
+        for name in names:
+            if name not in self:
+                raise KeyError(name)
+
+        self.blocks = tuple(ext for ext in self.blocks if ext.name not in names)
+        self.inlines = tuple(ext for ext in self.inlines
+                             if ext.name not in names)
+
+    def copy(self):
+        registry = self.__class__()
+        registry.blocks = self.blocks
+        registry.inlines = self.inlines
+        return registry
+
+    def names(self):
+        return tuple(dict.fromkeys(ext.name
+                                   for ext in self.blocks + self.inlines))
+
+    def __contains__(self, name):
+        return name in self.names()
+
+    def __eq__(self, other):
+        if not isinstance(other, Registry):
+            return NotImplemented
+        return (self.blocks, self.inlines) == (other.blocks, other.inlines)
+
+    def __hash__(self):
+        return hash((self.blocks, self.inlines))
+
+    def line_rules(self):
+        # First character -> ((kind, pattern), ...) in the order to try them.
+        # A whitespace or digit trigger also gets the INDENTED rules.
+        order = {ext: i for i, ext in enumerate(self.blocks)}
+        table = {}
+        for ext in self.blocks:
+            for char in ext.triggers:
+                table.setdefault(char, []).append(ext)
+        indented = table.get(INDENTED, [])
+        for char, exts in table.items():
+            if char and (char.isspace() or char.isdecimal()):
+                exts.extend(ext for ext in indented if ext not in exts)
+
+        return {
+            char: tuple((ext.kind, ext.pattern)
+                        for ext in sorted(exts,
+                                          key=lambda ext:
+                                          (-ext.priority, order[ext])))
+            for char, exts in table.items()
+        }
+
+    def inline_order(self):
+        return sorted(self.inlines, key=lambda ext: -ext.priority)
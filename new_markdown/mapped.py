@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import codecs
+import mmap
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+
+# Granularity of the line index, in bytes of input.
+INDEX_CHUNK = 1 << 16
+# Pages already read are released from the mapping every this many bytes, so
+# a sequential pass does not keep the whole file resident.
+RELEASE_SIZE = 8 << 20
+
+
+def newline_compatible(encoding):
+    # Whether lines can be cut on the byte b'\n' before decoding, i.e. '\r'
+    # and '\n' encode to those single bytes (not so in utf-16 or utf-32).
+    # A byte order mark at the start does not matter.
+    encoder = codecs.getincrementalencoder(encoding)()
+    encoder.encode('x')
+    return encoder.encode('\r\n') == b'\r\n'
+
+
+class MappedLines(Sequence):
+    # The lines of a file, decoded on access from a read-only memory map and
+    # without their line endings, like iterating over the file in text mode.
+    # The index holds one line count per INDEX_CHUNK bytes instead of one
+    # offset per line; a lookup scans forward from the chunk start. It is
+    # only built by len() or indexing, so a plain iteration reads the file
+    # once.
+
+    def __init__(self, path, encoding='utf-8') -> None:
+        super().__init__()
+        if not newline_compatible(encoding):
+            raise ValueError(f'Lines cannot be split on bytes in {encoding}')
+        self.encoding = encoding
+        self._fp = open(path, 'rb')
+        self._mm = None
+        self._size = 0
+        self._newlines = None
+        self._count = 0
+        try:
+            self._map()
+        except BaseException:
+            self._fp.close()
+            raise
+
+    def _map(self):
+        self._size = size = self._fp.seek(0, 2)
+        if not size:
+            return
+
+        self._mm = mm = mmap.mmap(self._fp.fileno(),
+                                  0,
+                                  access=mmap.ACCESS_READ)
+        if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+
+    def _index(self):
+        if self._newlines is not None:
+            return
+
+        # _newlines[k] is the number of newlines before chunk k.
+        mm, size = self._mm, self._size
+        newlines = array('Q')
+        count = 0
+        for start in range(0, size, INDEX_CHUNK):
+            if start and not start % RELEASE_SIZE:
+                self._release(start - RELEASE_SIZE, start)
+            newlines.append(count)
+            count += mm[start:start + INDEX_CHUNK].count(b'\n')
+        if size:
+            self._release(size - size % RELEASE_SIZE, size)
+            # A last line without a newline still counts.
+            count += mm[size - 1] != 0x0a
+        self._count = count
+        self._newlines = newlines
+
+    def _release(self, start, end):
+        if not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+
+        start -= start % mmap.PAGESIZE
+        if end > start:
+            self._mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def _line_start(self, index):
+        # Offset of the first byte of line `index`, the one after its
+        # index-th newline.
+        if not index:
+            return 0
+
+        chunk = bisect_left(self._newlines, index) - 1
+        pos = chunk * INDEX_CHUNK - 1
+        for _ in range(index - self._newlines[chunk]):
+            pos = self._mm.find(b'\n', pos + 1)
+        return pos + 1
+
+    def _decode(self, start, end):
+        line = self._mm[start:end].decode(self.encoding)
+        return line[:-1] if line.endswith('\r') else line
+
+    def __len__(self):
+        self._index()
+        return self._count
+
+    def __getitem__(self, index):
+        self._index()
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('line index out of range')
+
+        start = self._line_start(index)
+        end = self._mm.find(b'\n', start)
+        return self._decode(start, self._size if end < 0 else end)
+
+    def __iter__(self):
+        mm, size = self._mm, self._size
+        start = released = 0
+        while start < size:
+            end = mm.find(b'\n', start)
+            if end < 0:
+                end = size
+            yield self._decode(start, end)
+            start = end + 1
+            if start - released >= RELEASE_SIZE:
+                self._release(released, start)
+                released = start - start % mmap.PAGESIZE
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import secrets
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+
+from new_markdown.core import ConvertContext, directory_first, write_atomic
+from new_markdown.document import iter_render
+from new_markdown.mapped import newline_compatible
+
+# Inputs are cut into chunks of at least this many bytes.
+PARALLEL_CHUNK = 4 << 20
+
+HEADER_RESERVE = 0
+HEADER_REGISTER = 1
+HEADER_RECORD = 2
+
+newline_re = re.compile(b'\n')
+
+_markdowns = {}
+
+
+class DeferredContext(ConvertContext):
+    # Used by the workers. Header ids that depend on the headers before
+    # the chunk are handed out as sentinels, and every header event is
+    # logged so the parent can replay it on the document's real context.
+
+    def __init__(self, token) -> None:
+        super().__init__()
+        self.token = token
+        self.events = []
+        self.nsentinels = 0
+
+    def reserve_header_id(self, hid):
+        self.events.append((HEADER_RESERVE, hid))
+
+    def register_header_id(self, hid):
+        self.events.append((HEADER_REGISTER, hid))
+        sentinel = f'\0{self.token}{self.nsentinels}\0'
+        self.nsentinels += 1
+        return sentinel
+
+    def add_to_directory(self, level, hid, text):
+        self.events.append((HEADER_RECORD, level, hid, text))
+
+
+def _decode(view, start, end, encoding):
+    line = str(view[start:end], encoding)
+    return line[:-1] if line.endswith('\r') else line
+
+
+def split_offsets(md, view, chunk_size, encoding='utf-8'):
+    # Byte offsets at which the input can be cut: starts of top-level blocks
+    # as md.split_blocks finds them, so no fence, list, table or quote is
+    # split. starts holds the offset of every line read since the last cut.
+    starts = array('Q')
+    size = len(view)
+
+    def lines():
+        start = 0
+        for match in newline_re.finditer(view):
+            starts.append(start)
+            yield _decode(view, start, match.start(), encoding)
+            start = match.end()
+        if start < size:
+            starts.append(start)
+            yield _decode(view, start, size, encoding)
+
+    last = base = index = 0
+    for block, _ in md.split_blocks(lines()):
+        offset = starts[index - base]
+        if offset - last >= chunk_size:
+            yield offset
+            last = offset
+            del starts[:index - base]
+            base = index
+        index += len(block)
+
+
+def _markdown(options):
+    md = _markdowns.get(options)
+    if md is None:
+        cls, recording_headers, directory_title, header_ids, extensions = (
+            options)
+        md = _markdowns[options] = cls(recording_headers=recording_headers,
+                                       directory_title=directory_title,
+                                       header_ids=header_ids,
+                                       extensions=extensions)
+
+    return md
+
+
+def render_chunk(options, name, start, end, encoding, token):
+    md = _markdown(options)
+    shm = SharedMemory(name=name)
+    try:
+        with shm.buf[start:end] as view:
+            text = str(view, encoding)
+    finally:
+        shm.close()
+
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    lines = [line[:-1] if line.endswith('\r') else line for line in lines]
+
+    ctx = DeferredContext(token)
+    html = ''.join(md.iter_render(md.iter_elements(lines, ctx)))
+    return html, ctx.events
+
+
+def replay(ctx, events, html, token):
+    # Applies a chunk's header events to ctx in order and puts the real ids
+    # in place of the chunk's sentinels.
+    ids = []
+
+    def resolve(hid):
+        if hid.startswith(f'\0{token}'):
+            return ids[int(hid[1 + len(token):-1])]
+        return hid
+
+    for event in events:
+        if event[0] == HEADER_RESERVE:
+            ctx.reserve_header_id(event[1])
+        elif event[0] == HEADER_REGISTER:
+            ids.append(ctx.register_header_id(event[1]))
+        else:
+            _, level, hid, text = event
+            ctx.add_to_directory(level, resolve(hid), text)
+
+    if not ids:
+        return html
+
+    return re.sub(f'\0{token}(\\d+)\0', lambda m: ids[int(m[1])], html)
+
+
+def iter_chunks(md, path, workers=None, chunk_size=PARALLEL_CHUNK,
+                encoding='utf-8', ctx=None):
+    # Yields the HTML of each chunk in document order, with the header
+    # events already applied to ctx.
+    if not newline_compatible(encoding):
+        raise ValueError(f'Inputs in {encoding} cannot be cut on bytes')
+    if ctx is None:
+        ctx = ConvertContext()
+
+    size = os.path.getsize(path)
+    options = (md.__class__, md.recording_headers, md.directory_title,
+               md.header_ids, md.extensions)
+    token = secrets.token_hex(4)
+    shm = SharedMemory(create=True, size=max(size, 1))
+    try:
+        with open(path, 'rb') as fin, shm.buf[:size] as view:
+            fin.readinto(view)
+            offsets = [0]
+            offsets.extend(split_offsets(md, view, chunk_size, encoding))
+        offsets.append(size)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(render_chunk, options, shm.name, start, end,
+                                encoding, token)
+                for start, end in zip(offsets, offsets[1:])
+            ]
+            for future in futures:
+                html, events = future.result()
+                yield replay(ctx, events, html, token)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def convert_file(md,
+                 path,
+                 out_path,
+                 final=False,
+                 workers=None,
+                 chunk_size=PARALLEL_CHUNK,
+                 encoding='utf-8'):
+    # Same output as md.convert_file(path, out_path, final), rendered on a
+    # pool of worker processes. Encodings that cannot be cut on bytes, such
+    # as utf-16, are converted serially.
+    if (workers == 1 or os.path.getsize(path) <= chunk_size or
+            not newline_compatible(encoding)):
+        return md.convert_file(path, out_path, final, encoding)
+
+    ctx = ConvertContext()
+    chunks = iter_render(
+        iter_chunks(md, path, workers, chunk_size, encoding, ctx))
+    if final and md.recording_headers:
+        chunks = directory_first(chunks, partial(md.directory, ctx))
+    write_atomic(out_path, chunks, encoding)
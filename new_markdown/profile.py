@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+def _size(items):
+    # Lazy elements are not rendered here, which would run their work a
+    # second time; their bytes are counted as they render (see wrap_rows).
+    return sum(
+        len(f'{item}') for item in items if not getattr(item, 'lazy', False))
+
+
+class Stat(object):
+
+    def __init__(self, name) -> None:
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.self_seconds = 0.0
+        self.bytes = 0
+
+
+class Profiler(object):
+    # Counts calls, wall time and emitted HTML bytes per block handler and
+    # per inline stage. Markdown only routes through it when one is passed
+    # in, so an unprofiled Markdown runs the plain methods.
+    #
+    # Inline stages call each other, so `seconds` and `bytes` include the
+    # stages below; `self_seconds` excludes them.
+
+    def __init__(self) -> None:
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def attach(self, md):
+        md._handlers = {
+            kind: self.wrap_handler(handler.__name__, handler)
+            for kind, handler in md._handlers.items()
+        }
+        md._stages = [(name, self.wrap_stage(name, stage))
+                      for name, stage in md._stages]
+        md._pipelines.clear()
+
+    def _enter(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        return stack
+
+    def _leave(self, stack, name, begin, out, calls=1):
+        seconds = time.perf_counter() - begin
+        nbytes = _size(out)
+        # Sizing the output is profiler overhead, so it is charged to
+        # neither this call nor its caller's self time.
+        elapsed = time.perf_counter() - begin
+        child_seconds = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with self._lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = Stat(name)
+            stat.calls += calls
+            stat.seconds += seconds
+            stat.self_seconds += seconds - child_seconds
+            stat.bytes += nbytes
+
+    def wrap_handler(self, name, handler):
+
+        def wrapped(lines, start, kinds, ctx):
+            stack = self._enter()
+            begin = time.perf_counter()
+            ele = None
+            try:
+                ele, nstart = handler(lines, start, kinds, ctx)
+            finally:
+                self._leave(stack, name, begin, [] if ele is None else [ele])
+            if getattr(ele, 'lazy', False):
+                ele.rows = self.wrap_rows(name, ele.rows)
+            return ele, nstart
+
+        return wrapped
+
+    def wrap_rows(self, name, rows):
+        # A streamed table renders its rows after its handler returned, so
+        # that work is charged to the handler as it happens. Only the time
+        # inside each step counts, not the consumer's between them.
+
+        def wrapped():
+            chunks = rows()
+            while True:
+                stack = self._enter()
+                begin = time.perf_counter()
+                chunk = None
+                try:
+                    chunk = next(chunks, None)
+                finally:
+                    self._leave(stack, name, begin,
+                                [] if chunk is None else [chunk], 0)
+                if chunk is None:
+                    return
+                yield chunk
+
+        return wrapped
+
+    def wrap_stage(self, name, stage):
+
+        def wrapped(line, lo, hi, out, nxt):
+            stack = self._enter()
+            n = len(out)
+            begin = time.perf_counter()
+            try:
+                stage(line, lo, hi, out, nxt)
+            finally:
+                self._leave(stack, f'inline:{name}', begin, out[n:])
+
+        return wrapped
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+    def report(self):
+        stats = sorted(self.stats.values(),
+                       key=lambda stat: stat.self_seconds,
+                       reverse=True)
+        total = sum(stat.self_seconds for stat in stats) or 1.0
+        lines = [
+            f'{"name":<18}{"calls":>10}{"total ms":>12}{"self ms":>12}'
+            f'{"self %":>8}{"KB out":>10}'
+        ]
+        for stat in stats:
+            lines.append(f'{stat.name:<18}{stat.calls:>10}'
+                         f'{stat.seconds * 1e3:>12.2f}'
+                         f'{stat.self_seconds * 1e3:>12.2f}'
+                         f'{stat.self_seconds / total:>8.1%}'
+                         f'{stat.bytes / 1024:>10.1f}')
+        return '\n'.join(lines)
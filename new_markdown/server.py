@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from new_markdown.cache import LRUCache, RenderCache
+from new_markdown.core import Markdown
+
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_ENTRIES = 1024
+MAX_BODY = 64 << 20
+# Percentiles are taken over this many of the latest requests.
+LATENCY_WINDOW = 10000
+HEADER_IDS = ('random', 'slug')
+
+_markdowns = {}
+
+
+def render(options, text, final):
+    md = _markdowns.get(options)
+    if md is None:
+        recording_headers, directory_title, header_ids = options
+        md = _markdowns[options] = Markdown(
+            recording_headers=recording_headers,
+            directory_title=directory_title,
+            header_ids=header_ids)
+
+    return md.convert(text, final=final)
+
+
+def percentile(ordered, q):
+    # Nearest rank on an already sorted sequence.
+    if not ordered:
+        return None
+
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Stats(object):
+
+    def __init__(self, window=LATENCY_WINDOW) -> None:
+        super().__init__()
+        self.requests = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += bool(error)
+            self._latencies.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            ordered = sorted(self._latencies)
+            requests, errors = self.requests, self.errors
+
+        latency = {
+            name: None if value is None else round(value * 1e3, 3)
+            for name, value in (('p50', percentile(ordered, 0.50)),
+                                ('p90', percentile(ordered, 0.90)),
+                                ('p99', percentile(ordered, 0.99)),
+                                ('max', ordered[-1] if ordered else None))
+        }
+        return {'requests': requests, 'errors': errors, 'latency_ms': latency}
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    # POST /render takes a JSON object: `text` and optionally `final`,
+    # `recording_headers`, `directory_title` and `header_ids`. The HTML is
+    # returned as is, with X-Cache: hit or miss. GET /stats returns counters
+    # and latency percentiles as JSON.
+
+    def do_GET(self):
+        if self.path != '/stats':
+            return self.send_text(404, 'not found')
+
+        self.send_json(200, self.server.stats())
+
+    def do_POST(self):
+        if self.path != '/render':
+            return self.send_text(404, 'not found')
+
+        begin = time.perf_counter()
+        status, body, cached = self.render()
+        self.server.latency.record(time.perf_counter() - begin, status != 200)
+        if status != 200:
+            return self.send_text(status, body)
+
+        self.send_text(200, body, 'text/html', {
+            'X-Cache': 'hit' if cached else 'miss',
+        })
+
+    def render(self):
+        # Without a usable length the body cannot be read or skipped, so
+        # the connection is closed after the error.
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self.close_connection = True
+            return 411, 'Content-Length required', False
+        try:
+            length = int(length)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            self.close_connection = True
+            return 400, f'bad request: invalid Content-Length: {length}', False
+        if length > self.server.max_body:
+            self.close_connection = True
+            return 413, 'document too large', False
+
+        try:
+            request = json.loads(self.rfile.read(length))
+            text = request['text']
+            final = bool(request.get('final', False))
+            options = (bool(request.get('recording_headers', False)),
+                       request.get('directory_title'),
+                       request.get('header_ids', 'random'))
+            if not isinstance(text, str) or not isinstance(
+                    options[1], (str, type(None))):
+                raise TypeError('text and directory_title must be strings')
+            if options[2] not in HEADER_IDS:
+                raise ValueError(f'header_ids must be one of {HEADER_IDS}')
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return 400, f'bad request: {type(e).__name__}: {e}', False
+
+        try:
+            return (200, ) + self.server.render(text, options, final)
+        except Exception as e:
+            return 500, f'{type(e).__name__}: {e}', False
+
+    def send_json(self, status, obj):
+        self.send_text(status, json.dumps(obj), 'application/json')
+
+    def send_text(self, status, text, content_type='text/plain', headers=()):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in dict(headers).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class RenderServer(ThreadingHTTPServer):
+    # Results are kept in an LRU keyed by the hash of the text and the
+    # options. Conversions run on `workers` processes, or on the request
+    # threads when workers is 0.
+    daemon_threads = True
+
+    def __init__(self,
+                 address=(HOST, PORT),
+                 workers=None,
+                 cache_entries=CACHE_ENTRIES,
+                 max_body=MAX_BODY,
+                 verbose=False) -> None:
+        super().__init__(address, RenderHandler)
+        self.cache = LRUCache(maxsize=cache_entries)
+        self.latency = Stats()
+        self.max_body = max_body
+        self.verbose = verbose
+        self.workers = os.cpu_count() if workers is None else workers
+        self.executor = None
+        if self.workers:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            # Start the worker processes now, before any request thread.
+            self.executor.submit(int).result()
+
+    def render(self, text, options, final):
+        key = RenderCache.key(text, (options, final))
+        html = self.cache.get(key)
+        if html is not None:
+            return html, True
+
+        if self.executor is None:
+            html = render(options, text, final)
+        else:
+            html = self.executor.submit(render, options, text, final).result()
+        self.cache.put(key, html)
+        return html, False
+
+    def stats(self):
+        stats = self.latency.snapshot()
+        stats['cache'] = self.cache.stats()
+        stats['workers'] = self.workers
+        return stats
+
+    def server_close(self):
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        'Serve markdown to html conversions over HTTP.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--workers',
+                        type=int,
+                        default=None,
+                        help='worker processes, 0 to convert on the request '
+                        'threads, default: number of CPUs')
+    parser.add_argument('--cache_entries',
+                        type=int,
+                        default=CACHE_ENTRIES,
+                        help=f'results kept in memory, default: '
+                        f'{CACHE_ENTRIES}')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    args = parser.parse_args(argv)
+
+    server = RenderServer((args.host, args.port),
+                          workers=args.workers,
+                          cache_entries=args.cache_entries,
+                          verbose=args.verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+from collections import namedtuple
+
+INTERVAL = 0.2
+DEBOUNCE = 0.3
+
+# latency runs from the first change seen to the end of the rebuild.
+Rebuild = namedtuple('Rebuild', ['results', 'seconds', 'latency'])
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class Watcher(object):
+    # Polls the inputs of `collect()` and passes changed jobs to `convert`,
+    # in this process, so the Markdown instances and caches stay warm. A
+    # rebuild starts once no input has changed for `debounce` seconds, so a
+    # burst of saves costs one rebuild.
+
+    def __init__(self,
+                 collect,
+                 convert,
+                 interval=INTERVAL,
+                 debounce=DEBOUNCE,
+                 report=None) -> None:
+        super().__init__()
+        self.collect = collect
+        self.convert = convert
+        self.interval = interval
+        self.debounce = debounce
+        self.report = report
+        self._signatures = {}
+        self._pending = {}
+        self._first = self._last = None
+
+    def changed(self):
+        jobs = self.collect()
+        signatures = {}
+        changed = []
+        for job in jobs:
+            signature = file_signature(job.input)
+            if signature is None:
+                continue
+            signatures[job.input] = signature
+            if self._signatures.get(job.input) != signature:
+                changed.append(job)
+
+        self._signatures = signatures
+        return changed
+
+    def poll(self, now=None):
+        if now is None:
+            now = time.monotonic()
+
+        changed = self.changed()
+        if changed:
+            for job in changed:
+                self._pending[job.input] = job
+            if self._first is None:
+                self._first = now
+            self._last = now
+
+        if not self._pending or now - self._last < self.debounce:
+            return None
+
+        begin = time.monotonic()
+        results = [self.convert(job) for job in self._pending.values()]
+        seconds = time.monotonic() - begin
+        rebuild = Rebuild(results, seconds, now - self._first + seconds)
+        self._pending = {}
+        self._first = self._last = None
+        return rebuild
+
+    def run(self, stop=None):
+        # Until stop (e.g. a threading.Event) is set or KeyboardInterrupt.
+        try:
+            while stop is None or not stop.is_set():
+                rebuild = self.poll()
+                if rebuild is not None and self.report is not None:
+                    self.report(rebuild)
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
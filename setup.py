@@ -18,6 +18,8 @@ setup(name='new_markdown',
       license=license,
       zip_safe=False,
       packages=find_packages(exclude=('tests', 'docs')),
-      scripts=[
-          'scripts/md2html',
-      ])
+      entry_points={
+          'console_scripts': [
+              'md2html = new_markdown.cli:main',
+          ],
+      })
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from new_markdown.aio import AsyncMarkdown, read_text
+from new_markdown.core import ConvertCancelled, ConvertContext, Markdown
+
+
+class AsyncTestCase(unittest.TestCase):
+
+    def test_convert(self):
+        mdtext = '# Title\nSome *text*\n\n- item'
+
+        async def main():
+            async with AsyncMarkdown(max_concurrency=2) as amd:
+                return await asyncio.gather(
+                    *[amd.convert(mdtext) for _ in range(5)])
+
+        htmls = asyncio.run(main())
+        self.assertEqual(htmls, [Markdown().convert(mdtext)] * 5)
+
+    def test_several_loops(self):
+        release = threading.Event()
+
+        class Blocking(Markdown):
+
+            def convert(self, textlines, *args):
+                release.wait(10)
+                return super().convert(textlines, *args)
+
+        amd = AsyncMarkdown(Blocking(), max_concurrency=1)
+
+        async def main():
+            # The second conversion waits on the semaphore.
+            pending = [
+                asyncio.ensure_future(amd.convert('text')) for _ in range(2)
+            ]
+            await asyncio.sleep(0.05)
+            release.set()
+            return await asyncio.gather(*pending)
+
+        try:
+            for _ in range(2):
+                release.clear()
+                self.assertEqual(asyncio.run(main()), ['<p>text</p>'] * 2)
+        finally:
+            amd.close()
+
+    def test_convert_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'doc.md')
+            with open(path, 'w') as fout:
+                fout.write('Some **text**')
+
+            async def main():
+                async with AsyncMarkdown() as amd:
+                    return await amd.convert_file(path)
+
+            self.assertEqual(asyncio.run(main()),
+                             '<p>Some <strong>text</strong></p>')
+
+    def test_convert_file_deadline(self):
+        timeouts = []
+
+        class Recording(AsyncMarkdown):
+
+            async def convert(self, text, final=False, timeout=None):
+                timeouts.append(timeout)
+                return await super().convert(text, final, timeout)
+
+        def slow_read(path, encoding='utf-8'):
+            time.sleep(0.05)
+            return read_text(path, encoding)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'doc.md')
+            with open(path, 'w') as fout:
+                fout.write('text')
+
+            async def main():
+                async with Recording() as amd:
+                    return await amd.convert_file(path, timeout=5)
+
+            with mock.patch('new_markdown.aio.read_text', slow_read):
+                self.assertEqual(asyncio.run(main()), '<p>text</p>')
+
+        # The conversion gets what the read left of the timeout.
+        self.assertLessEqual(timeouts[0], 4.95)
+        self.assertGreater(timeouts[0], 0)
+
+    def test_timeout(self):
+        mdtext = 'paragraph\n\n' * 20000
+
+        async def main():
+            async with AsyncMarkdown(large_size=1 << 10) as amd:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await amd.convert(mdtext, timeout=0.001)
+                # A small document is not stuck behind the large one.
+                return await amd.convert('small', timeout=5)
+
+        self.assertEqual(asyncio.run(main()), '<p>small</p>')
+
+    def test_queued_large(self):
+        release = threading.Event()
+
+        class Blocking(Markdown):
+
+            def convert(self, textlines, *args):
+                if len(textlines) >= 1 << 10:
+                    release.wait(10)
+                return super().convert(textlines, *args)
+
+        mdtext = 'paragraph\n\n' * 200
+
+        async def main():
+            async with AsyncMarkdown(Blocking(),
+                                     max_concurrency=2,
+                                     large_size=1 << 10) as amd:
+                large = [
+                    asyncio.ensure_future(amd.convert(mdtext))
+                    for _ in range(4)
+                ]
+                await asyncio.sleep(0.05)
+                # Every large document is still queued or converting.
+                small = await asyncio.wait_for(amd.convert('small'), 5)
+                release.set()
+                return small, await asyncio.gather(*large)
+
+        small, large = asyncio.run(main())
+        self.assertEqual(small, '<p>small</p>')
+        self.assertEqual(large, [Markdown().convert(mdtext)] * 4)
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(ConvertCancelled):
+            Markdown().convert('text', cancel=cancel)
+
+        # Streamed table rows render after parsing, and are cancelled there
+        # as well.
+        cancel.clear()
+        rows = '\n'.join(f'| {i} | *x* |' for i in range(10000))
+        mdtext = f'| a | b |\n| :-: | --: |\n{rows}'
+        chunks = Markdown().convert_lines(mdtext.split('\n'),
+                                          ctx=ConvertContext(cancel=cancel))
+        next(chunks)
+        cancel.set()
+        with self.assertRaises(ConvertCancelled):
+            list(chunks)
+
+        # A parsed document is complete, so it renders whatever happens to
+        # the event afterwards.
+        cancel.clear()
+        doc = Markdown().parse(mdtext, ConvertContext(cancel=cancel))
+        cancel.set()
+        self.assertEqual(doc.render(), Markdown().convert(mdtext))
+
+
+if __name__ == '__main__':
+    unittest.main()
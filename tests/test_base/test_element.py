@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
 
+import io
 import sys
 import os
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 # import ipdb
 sys.path.insert(0,
                 os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from new_markdown import Element
-from new_markdown.core import Markdown
-from new_markdown.elements import hr
+from new_markdown.core import (ALIGN_ATTRS, ConvertContext, Heading, Image,
+                               Link, Markdown)
+from new_markdown.document import Document
+from new_markdown.elements import hr, streamed_table, td
 
 
 class BasicTestCase(unittest.TestCase):
@@ -28,6 +32,57 @@ class BasicTestCase(unittest.TestCase):
         res = '<hr>'
         self.assertEqual(str(ele), res)
 
+    def test_render(self):
+        ele = Element(tag_name='div', children=['a', hr(), 'b'])
+        out = io.StringIO()
+        ele.render(out)
+        self.assertEqual(out.getvalue(), '<div>a<hr>b</div>')
+        self.assertEqual(''.join(ele.iter_render()), str(ele))
+
+    def test_render_deep_tree(self):
+        depth = sys.getrecursionlimit() * 2
+        ele = 'leaf'
+        for _ in range(depth):
+            ele = Element(tag_name='b', children=[ele])
+        self.assertEqual(str(ele), '<b>' * depth + 'leaf' + '</b>' * depth)
+
+    def test_compact_layout(self):
+        ele = td(children='text', attrs=ALIGN_ATTRS['left'])
+        other = td(children='more', attrs=ALIGN_ATTRS['left'])
+        self.assertFalse(hasattr(ele, '__dict__'))
+        self.assertEqual(ele.children, 'text')
+
+        ele.add_attr('class', 'x')
+        ele.add_child(hr())
+        self.assertEqual(str(ele),
+                         '<td style="text-align: left" class="x">text<hr></td>')
+        self.assertEqual(str(other), '<td style="text-align: left">more</td>')
+        self.assertEqual(dict(ALIGN_ATTRS['left']),
+                         {'style': 'text-align: left'})
+
+    def test_streamed_table(self):
+        rows = lambda: iter(['<tr><td>1</td></tr>', '<tr><td>2</td></tr>'])
+        ele = streamed_table(head=None, rows=rows)
+        html = ('<table class="table"><tbody><tr><td>1</td></tr>'
+                '<tr><td>2</td></tr></tbody></table>')
+        self.assertEqual(str(ele), html)
+        self.assertEqual(str(ele), html)
+        self.assertEqual(str(Element(tag_name='div', children=[ele, 'x'])),
+                         f'<div>{html}x</div>')
+
+        md = Markdown()
+        lines = ['| a | b |', '| :-- | --: |']
+        lines += [f'| *{i}* | $x | {i}$ |' for i in range(600)]
+        rows = ''.join(
+            str(md.handle_td_line(line, aligns=['left', 'right']))
+            for line in lines[2:])
+        self.assertEqual(
+            md.convert('\n'.join(lines)),
+            '<table class="table"><thead><tr>'
+            '<th style="text-align: left">a</th>'
+            '<th style="text-align: right">b</th></tr></thead>'
+            f'<tbody>{rows}</tbody></table>')
+
 
 class MarkdownTestCase(unittest.TestCase):
 
@@ -490,3 +545,248 @@ $$
         html = self.md.convert(mdtext)
         # self.show(html)
         self.assertEqual(html.strip(), result.strip())
+
+    def test_line_kinds(self):
+        from new_markdown.core import (LINE_BLANK, LINE_CODE, LINE_HEADER,
+                                       LINE_HR, LINE_LIST, LINE_MATH,
+                                       LINE_QUOTE, LINE_TABLE, LINE_TEXT,
+                                       classify_lines)
+        lines = [
+            '', '   ', '---', '***', '- item', '    1. item', '# title',
+            '> quote', '| a | b |', '|a', '```python', '$$', '$x$', '-text',
+            'text'
+        ]
+        kinds = [
+            LINE_BLANK, LINE_BLANK, LINE_HR, LINE_HR, LINE_LIST, LINE_LIST,
+            LINE_HEADER, LINE_QUOTE, LINE_TABLE, LINE_TEXT, LINE_CODE,
+            LINE_MATH, LINE_TEXT, LINE_TEXT, LINE_TEXT
+        ]
+        self.assertEqual(list(classify_lines(lines)), kinds)
+
+    def test_special_first_char(self):
+        mdtext = """
+-not a list
+=not a header
+| single row |
+```python
+"""
+        result = """
+<p>-not a list</p>
+<p>=not a header</p>
+<table class="table"><tbody><tr><td style="text-align: center">single row</td></tr></tbody></table>
+<p>```python</p>
+"""
+        html = self.md.convert(mdtext)
+        self.assertEqual(html.strip(), result.strip())
+
+    def test_inline_many_markers(self):
+        line = '*em* **strong** `code` [a](b.com) ' * 2000
+        html = ''.join(f'{c}' for c in self.md.code(line.strip()))
+        unit = '<em>em</em> <strong>strong</strong> <code>code</code> '\
+            '<a href="http://b.com">a</a> '
+        self.assertEqual(html, (unit * 2000).strip())
+
+    def test_convert_iter(self):
+        mdtext = """
+# header 1
+Some *text*
+```python
+a < b
+```
+| a | b |
+| :-- | --: |
+| 1 | 2 |
+```
+unclosed fence
+- item
+"""
+        html = ''.join(self.md.convert_iter(io.StringIO(mdtext)))
+        self.assertEqual(html, self.md.convert(mdtext))
+        crlf = io.StringIO(mdtext.replace('\n', '\r\n'), newline='')
+        self.assertEqual(''.join(self.md.convert_iter(crlf)), html)
+
+        md = Markdown(recording_headers=True, directory_title='TOC')
+        html = ''.join(
+            md.convert_iter(io.StringIO(mdtext), final=True, spool_size=16))
+        head, body = html.split('<hr>' + os.linesep, 1)
+        self.assertTrue(head.startswith('<div id="article-directory"'))
+        self.assertTrue(body.startswith('<h1 id="id-h1-'))
+        self.assertTrue(body.endswith('<ul><li>item</li></ul>'))
+
+        # Without headers there is no directory, and nothing before the body.
+        html = ''.join(
+            md.convert_iter(io.StringIO('hello\n'), final=True, spool_size=16))
+        self.assertEqual(html, md.convert('hello', final=True))
+        self.assertEqual(html, '<p>hello</p>')
+
+    def test_outline(self):
+        mdtext = """
+# Guide
+### Deep
+## Setup
+```
+# not a header
+```
+$$
+# not a header either
+$$
+> ## Quoted {#quoted}
+# Guide
+"""
+        md = Markdown(recording_headers=True,
+                      header_ids='slug',
+                      directory_title='TOC')
+        root = md.outline(mdtext)
+        self.assertEqual([child.text for child in root.children],
+                         ['Guide', 'Guide'])
+        self.assertEqual(root.children[0].as_dict()['children'], [
+            {'level': 3, 'id': 'deep', 'text': 'Deep', 'children': []},
+            {'level': 2, 'id': 'setup', 'text': 'Setup', 'children': []},
+            {'level': 2, 'id': 'quoted', 'text': 'Quoted ', 'children': []},
+        ])
+        self.assertEqual(root.children[1].link, 'guide-1')
+
+        toc = md.outline_html(mdtext)
+        self.assertTrue(toc.startswith('<div id="article-directory"'))
+        self.assertTrue(md.convert(mdtext, final=True).startswith(toc))
+        self.assertEqual(Markdown().outline_html('no headers'), '')
+        self.assertTrue(
+            str(md.extract_ul_directory(mdtext)).startswith(
+                '<ul><li><a href="#guide">Guide</a><ul>'))
+
+    def test_scan(self):
+        mdtext = """
+# Title {#top}
+See [docs](example.com) and `[not](a-link)` or $[x](y)$.
+> [![logo](logo.png "Logo"){width="20"}](/home)
+
+| a | b |
+| :-: | :-: |
+| [cell](#c) | $$x$$ |
+```
+[code](block)
+```
+$$
+e
+$$
+"""
+        meta = self.md.scan(mdtext)
+        self.assertEqual(meta.headings, [Heading(1, 'Title', 'top')])
+        self.assertEqual(meta.links, [
+            Link('docs', 'http://example.com'),
+            Link('logo', '/home'),
+            Link('cell', '#c')
+        ])
+        self.assertEqual(meta.images,
+                         [Image('logo.png', 'logo', 'Logo', {'width': '20'})])
+        self.assertEqual((meta.inline_formulas, meta.display_formulas), (1, 2))
+
+    def test_deep_nesting(self):
+        depth = sys.getrecursionlimit()
+        mdtext = '\n'.join(f'{"    " * i}- item {i}' for i in range(depth))
+        html = self.md.convert(mdtext)
+        self.assertTrue(html.startswith('<ul><li>item 0<ul><li>item 1<ul>'))
+        self.assertEqual(html.count('<ul>'), depth)
+        self.assertTrue(html.endswith('</li></ul>' * depth))
+
+        mdtext = '\n'.join(f'{"> " * i}quote {i}' for i in range(1, 300))
+        html = self.md.convert(mdtext)
+        self.assertEqual(html.count('<blockquote class="blockquote">'), 299)
+        self.assertIn('<p>quote 2</p>', html)
+
+    def test_document(self):
+        mdtext = """
+# Title
+## Sub
+> quote **bold**
+- a
+    - `b`
+
+| x | y |
+| :- | -: |
+| 1 | $a|b$ |
+
+$$
+x^2
+$$
+"""
+        md = Markdown(recording_headers=True,
+                      directory_title='Contents',
+                      header_ids='slug')
+        doc = md.parse(mdtext)
+        self.assertEqual(doc.render(toc=True, directory_title='Contents'),
+                         md.convert(mdtext, final=True))
+        self.assertEqual(doc.render(), md.convert(mdtext))
+        self.assertEqual(doc.outline.children[0].text, 'Title')
+
+        loaded = Document.from_bytes(doc.to_bytes())
+        for toc in (False, True):
+            self.assertEqual(loaded.render(toc, 'TOC'), doc.render(toc, 'TOC'))
+        self.assertEqual(loaded.outline.as_dict(), doc.outline.as_dict())
+
+        # Table rows are parsed by parse(), not again by each render.
+        md = Markdown()
+        cells = []
+        table_cells = md.table_cells
+        md.table_cells = lambda line: cells.append(line) or table_cells(line)
+        rows = '\n'.join(f'| *{i}* | x |' for i in range(300))
+        doc = md.parse(f'| a | b |\n| :-: | --: |\n{rows}')
+        self.assertEqual(len(cells), 301)
+        html = doc.render()
+        self.assertEqual(doc.render(), html)
+        Document.from_bytes(doc.to_bytes())
+        self.assertEqual(len(cells), 301)
+        self.assertIn('<td style="text-align: right">x</td>', html)
+
+        depth = sys.getrecursionlimit()
+        mdtext = '\n'.join(f'{"    " * i}- item {i}' for i in range(depth))
+        doc = self.md.parse(mdtext)
+        self.assertEqual(Document.from_bytes(doc.to_bytes()).render(),
+                         doc.render())
+
+    def test_slug_header_ids(self):
+        mdtext = """
+# 第一章 简介
+## Intro
+## Intro
+## C++ & Rust
+## ???
+"""
+        result = """
+<div id="article-directory" class="article-directory"><li><a href="#第一章-简介">第一章 简介</a><ol><li><a href="#intro">Intro</a></li><li><a href="#intro-1">Intro</a></li><li><a href="#c-rust">C++ & Rust</a></li><li><a href="#h2">???</a></li></ol></li></div>
+<hr>
+<h1 id="第一章-简介">第一章 简介</h1>
+<h2 id="intro">Intro</h2>
+<h2 id="intro-1">Intro</h2>
+<h2 id="c-rust">C++ & Rust</h2>
+<h2 id="h2">???</h2>
+"""
+        for _ in range(2):
+            md = Markdown(recording_headers=True, header_ids='slug')
+            html = md.convert(mdtext, final=True)
+            self.assertEqual(html.strip(), result.strip())
+
+    def test_shared_instance(self):
+        md = Markdown(recording_headers=True, header_ids='slug')
+        docs = [
+            f'# Title {i}\n## Intro\n| a | $x_{i}$ |\n> ## Quoted\n'
+            for i in range(8)
+        ]
+        expected = [Markdown(recording_headers=True,
+                             header_ids='slug').convert(doc, final=True)
+                    for doc in docs]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for _ in range(5):
+                htmls = list(
+                    executor.map(lambda doc: md.convert(doc, final=True),
+                                 docs))
+                self.assertEqual(htmls, expected)
+        self.assertIn('<a href="#quoted">', expected[0])
+
+    def test_multipart_context(self):
+        md = Markdown(recording_headers=True, header_ids='slug')
+        ctx = ConvertContext()
+        md.convert('# Intro', ctx=ctx)
+        html = md.convert('# Intro', final=True, ctx=ctx)
+        self.assertIn('href="#intro"', html)
+        self.assertIn('<h1 id="intro-1">Intro</h1>', html)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import tempfile
+import unittest
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from new_markdown import batch, parallel
+from new_markdown.core import Markdown
+from new_markdown.mapped import MappedLines
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        self.src = os.path.join(self.root, 'src')
+        os.makedirs(os.path.join(self.src, 'sub'))
+        self.texts = {}
+        for name in ('a.md', 'b.md', os.path.join('sub', 'c.md')):
+            text = f'# {name}\nSome *text* in {name}.\n'
+            with open(os.path.join(self.src, name), 'w') as fout:
+                fout.write(text)
+            self.texts[name] = text
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def test_collect_jobs(self):
+        out_dir = os.path.join(self.root, 'out')
+        jobs = batch.collect_jobs([self.src], out_dir=out_dir)
+        self.assertEqual([os.path.relpath(job.output, out_dir) for job in jobs],
+                         ['a.html', 'b.html', os.path.join('sub', 'c.html')])
+
+        jobs = batch.collect_jobs([os.path.join(self.src, '*.md')])
+        self.assertEqual([job.output for job in jobs], [
+            os.path.join(self.src, 'a.html'),
+            os.path.join(self.src, 'b.html')
+        ])
+
+    def test_convert_many(self):
+        out_dir = os.path.join(self.root, 'out')
+        jobs = batch.collect_jobs([self.src], out_dir=out_dir)
+        jobs.insert(1, batch.Job(os.path.join(self.src, 'missing.md'),
+                                 os.path.join(out_dir, 'missing.html')))
+        results = list(batch.convert_many(jobs, workers=2))
+
+        self.assertEqual([result.input for result in results],
+                         [job.input for job in jobs])
+        self.assertEqual([bool(result.error) for result in results],
+                         [False, True, False, False])
+
+        md = Markdown()
+        for name, text in self.texts.items():
+            output = batch.output_path(os.path.join(self.src, name),
+                                       root=self.src,
+                                       out_dir=out_dir)
+            with open(output) as fin:
+                self.assertEqual(fin.read(), md.convert(text))
+
+    def test_cached_job(self):
+        path = os.path.join(self.root, 'utf8.md')
+        with open(path, 'w', encoding='utf-8') as fout:
+            fout.write('# 标题\nSome *text* — ünïcode\n')
+        job = batch.Job(path, os.path.join(self.root, 'out', 'utf8.html'))
+        cache_path = os.path.join(self.root, 'cache.db')
+
+        batch.convert_job(job, recording_headers=True, header_ids='slug')
+        with open(job.output, 'rb') as fin:
+            expected = fin.read()
+        for cached in (False, True):
+            os.unlink(job.output)
+            result = batch.convert_job(job,
+                                       recording_headers=True,
+                                       header_ids='slug',
+                                       cache_path=cache_path)
+            self.assertEqual((result.error, result.cached), (None, cached))
+            with open(job.output, 'rb') as fin:
+                self.assertEqual(fin.read(), expected)
+        self.assertEqual(os.listdir(os.path.dirname(job.output)),
+                         ['utf8.html'])
+
+    def test_convert_file(self):
+        path = os.path.join(self.root, 'crlf.md')
+        with open(path, 'w', encoding='utf-8', newline='') as fout:
+            fout.write('# 标题\r\n\r\n- a\r\n    - b\r\n\r\nlast line')
+        lines = ['# 标题', '', '- a', '    - b', '', 'last line']
+        with MappedLines(path) as mapped:
+            # Iterating alone does not index the lines.
+            self.assertEqual([line for line in mapped], lines)
+            self.assertIsNone(mapped._newlines)
+            self.assertEqual(list(mapped), lines)
+            self.assertEqual(len(mapped), len(lines))
+            self.assertEqual(mapped[2], '- a')
+            self.assertEqual(mapped[-1], 'last line')
+
+        md = Markdown(recording_headers=True, header_ids='slug')
+        out_path = os.path.join(self.root, 'crlf.html')
+        md.convert_file(path, out_path, final=True)
+        with open(out_path, encoding='utf-8') as fin:
+            self.assertEqual(fin.read(),
+                             md.convert('\n'.join(lines), final=True))
+        md.convert_file(path, out_path)
+        with open(out_path, encoding='utf-8') as fin:
+            self.assertEqual(fin.read(), md.convert('\n'.join(lines)))
+
+        with open(path, 'wb') as fout:
+            fout.write(b'\xff invalid')
+        with self.assertRaises(UnicodeDecodeError):
+            md.convert_file(path, out_path)
+        with open(out_path, encoding='utf-8') as fin:
+            self.assertIn('标题', fin.read())
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         ['crlf.html', 'crlf.md', 'src'])
+
+    def test_utf16_file(self):
+        path = os.path.join(self.root, 'utf16.md')
+        text = '\n\n'.join(f'# 标题 {i}\nline *{i}*' for i in range(40))
+        with open(path, 'w', encoding='utf-16') as fout:
+            fout.write(text)
+        with self.assertRaises(ValueError):
+            MappedLines(path, 'utf-16')
+
+        md = Markdown(recording_headers=True, header_ids='slug')
+        out_path = os.path.join(self.root, 'utf16.html')
+        md.convert_file(path, out_path, final=True, encoding='utf-16')
+        with open(out_path, encoding='utf-16') as fin:
+            self.assertEqual(fin.read(), md.convert(text, final=True))
+
+        # Not cut on bytes, so it falls back to the serial path.
+        os.unlink(out_path)
+        parallel.convert_file(md,
+                              path,
+                              out_path,
+                              final=True,
+                              workers=2,
+                              chunk_size=64,
+                              encoding='utf-16')
+        with open(out_path, encoding='utf-16') as fin:
+            self.assertEqual(fin.read(), md.convert(text, final=True))
+
+    def test_parallel_convert_file(self):
+        path = os.path.join(self.root, 'long.md')
+        parts = []
+        for i in range(40):
+            parts.append(f'# Part\n## Intro\n## Intro {{#intro-{i}}}\n'
+                         f'> ## Quoted\n> text {i}\n\n- a\n    - b\n\n'
+                         f'| x | y |\n| :- | -: |\n| {i} | $a|b$ |\n\n'
+                         f'```\n# not a header\n```\n\n$$\nx^{i}\n$$\n')
+        with open(path, 'w', encoding='utf-8') as fout:
+            fout.write('\n'.join(parts))
+
+        md = Markdown(recording_headers=True, header_ids='slug')
+        serial = os.path.join(self.root, 'serial.html')
+        split = os.path.join(self.root, 'split.html')
+        for final in (False, True):
+            md.convert_file(path, serial, final=final)
+            parallel.convert_file(md,
+                                  path,
+                                  split,
+                                  final=final,
+                                  workers=2,
+                                  chunk_size=256)
+            with open(serial, encoding='utf-8') as a, \
+                    open(split, encoding='utf-8') as b:
+                self.assertEqual(a.read(), b.read())
+
+        # A document without headers gets no directory, and no separator.
+        text = '\n\n'.join(f'paragraph {i}' for i in range(40))
+        plain = os.path.join(self.root, 'plain.md')
+        with open(plain, 'w', encoding='utf-8') as fout:
+            fout.write(text)
+        parallel.convert_file(md,
+                              plain,
+                              split,
+                              final=True,
+                              workers=2,
+                              chunk_size=64)
+        with open(split, encoding='utf-8') as fin:
+            self.assertEqual(fin.read(), md.convert(text, final=True))
+
+        with open(path, 'rb') as fin:
+            data = fin.read()
+        offsets = list(parallel.split_offsets(md, memoryview(data), 256))
+        self.assertGreater(len(offsets), 10)
+        self.assertTrue(all(data[offset - 1:offset] == b'\n'
+                            for offset in offsets))
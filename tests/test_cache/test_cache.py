@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import re
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from new_markdown.cache import LRUCache, RenderCache
+from new_markdown.core import Markdown, default_extensions
+
+
+def fill(path, worker):
+    cache = RenderCache(path)
+    for i in range(20):
+        key = RenderCache.key(f'{worker}-{i}', ())
+        cache.put(key, f'<p>{worker}-{i}</p>')
+        assert cache.get(key) == f'<p>{worker}-{i}</p>'
+    cache.close()
+    return worker
+
+
+class RenderCacheTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.db')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def test_get_put(self):
+        cache = RenderCache(self.path)
+        key = cache.key('# title', (False, None, False))
+        self.assertNotEqual(key, cache.key('# title', (True, None, False)))
+        self.assertIsNone(cache.get(key))
+        cache.put(key, '<h1>title</h1>')
+        self.assertEqual(cache.get(key), '<h1>title</h1>')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']),
+                         (1, 1, 1))
+        cache.close()
+
+    def test_eviction(self):
+        cache = RenderCache(self.path, max_size=100)
+        for i in range(10):
+            cache.put(f'key-{i}', 'x' * 30)
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 3)
+        self.assertEqual(stats['size'], 90)
+        self.assertIsNone(cache.get('key-0'))
+        self.assertIsNotNone(cache.get('key-9'))
+        cache.close()
+
+    def test_markdown_cache(self):
+        cache = RenderCache(self.path)
+        md = Markdown(cache=cache)
+        html = md.convert('Some *text*')
+        self.assertEqual(md.convert('Some *text*'), html)
+        self.assertEqual(cache.stats()['hits'], 1)
+        cache.close()
+
+    def test_concurrent_writers(self):
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            workers = list(
+                executor.map(fill, [self.path] * 4, range(4)))
+        self.assertEqual(workers, [0, 1, 2, 3])
+        cache = RenderCache(self.path)
+        self.assertEqual(cache.stats()['entries'], 80)
+        cache.close()
+
+
+class BlockCacheTestCase(unittest.TestCase):
+
+    def test_lru(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_markdown_block_cache(self):
+        mdtext = """
+## header
+Disclaimer: *nothing* here is advice.
+
+| a | b |
+| :-- | --: |
+| 1 | 2 |
+
+> quoted
+"""
+        block_cache = LRUCache(maxsize=16)
+        md = Markdown(block_cache=block_cache)
+        html = Markdown().convert(mdtext * 3)
+        self.assertEqual(md.convert(mdtext * 3), html)
+        self.assertEqual(block_cache.stats()['hits'], 8)
+
+        md = Markdown(recording_headers=True, block_cache=LRUCache())
+        html = md.convert(mdtext * 2)
+        self.assertEqual(len(set(re.findall(r'id="([^"]+)"', html))), 2)
+
+        # A cache shared between differently configured instances.
+        extensions = default_extensions()
+        extensions.remove('em')
+        for md in (Markdown(block_cache=block_cache),
+                   Markdown(block_cache=block_cache, extensions=extensions),
+                   Markdown(block_cache=block_cache, header_ids='slug')):
+            uncached = Markdown(header_ids=md.header_ids,
+                                extensions=md.extensions)
+            self.assertEqual(md.convert(mdtext), uncached.convert(mdtext))
+
+        # Same extension names, different stages.
+        def bold(md, line, lo, hi, out, nxt):
+            out.append(f'<b>{line[lo:hi]}</b>')
+
+        bolded = default_extensions()
+        bolded.inlines = tuple(
+            ext._replace(stage=bold) if ext.name == 'em' else ext
+            for ext in bolded.inlines)
+        self.assertEqual(bolded.names(), default_extensions().names())
+        self.assertEqual(Markdown(block_cache=block_cache).convert('*a*'),
+                         '<p><em>a</em></p>')
+        md = Markdown(block_cache=block_cache, extensions=bolded)
+        self.assertEqual(md.convert('*a*'), '<p><b>*a*</b></p>')
+        self.assertNotEqual(md.cache_options(), Markdown().cache_options())
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import json
+import subprocess
+import sys
+import os
+import tempfile
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Modules that a plain conversion must not load at startup.
+HEAVY = ('new_markdown.cache', 'new_markdown.parallel', 'sqlite3',
+         'multiprocessing', 'concurrent.futures', 'secrets', 'tempfile',
+         'hashlib')
+
+
+def loaded_modules(code):
+    # Runs code in a fresh interpreter and returns the modules it loaded.
+    code += '\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))'
+    proc = subprocess.run([sys.executable, '-c', code],
+                          cwd=ROOT,
+                          env=dict(os.environ, PYTHONPATH=ROOT),
+                          capture_output=True,
+                          text=True,
+                          check=True)
+    return set(json.loads(proc.stdout.splitlines()[-1]))
+
+
+class CliTestCase(unittest.TestCase):
+
+    def test_lazy_import(self):
+        modules = loaded_modules('import new_markdown')
+        self.assertNotIn('new_markdown.core', modules)
+
+        modules = loaded_modules('from new_markdown import Markdown\n'
+                                 'Markdown().convert("# x")')
+        self.assertIn('new_markdown.core', modules)
+        self.assertFalse(modules.intersection(HEAVY))
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, 'a.md')
+            dst = os.path.join(tmpdir, 'a.html')
+            with open(src, 'w') as fout:
+                fout.write('# Title\nSome *text*')
+
+            modules = loaded_modules(
+                'from new_markdown.cli import main\n'
+                f'assert main(["-i", {src!r}, "-o", {dst!r}]) == 0')
+            self.assertFalse(modules.intersection(HEAVY))
+            with open(dst) as fin:
+                self.assertEqual(fin.read(),
+                                 '<h1>Title</h1>\n<p>Some <em>text</em></p>')
+
+            proc = subprocess.run(
+                [sys.executable,
+                 os.path.join(ROOT, 'scripts', 'md2html'), src],
+                env=dict(os.environ, PYTHONPATH=ROOT),
+                capture_output=True,
+                text=True)
+            self.assertEqual(proc.returncode, 0)
+            self.assertIn('1 files, 0 failed', proc.stderr)
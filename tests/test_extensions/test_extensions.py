@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import pickle
+import re
+import unittest
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from new_markdown.core import LINE_HR, LINE_TEXT, Markdown, default_extensions
+from new_markdown.elements import Element, div, p
+from new_markdown.extensions import FENCE, FIRST_KIND, LINE, Registry
+
+note_open_re = re.compile(r'^:::(?P<kind>\w*)$')
+note_close_re = re.compile(r'^:::$')
+
+
+def note(md, lines, start, kinds, ctx):
+    if start + 1 == len(lines):
+        return p(children=lines[start]), start + 1
+
+    kind = note_open_re.match(lines[start])['kind'] or 'note'
+    children = md.code(' '.join(lines[start + 1:-1]))
+    return div(children=children, attrs={'class': kind}), len(lines)
+
+
+def page_break(md, lines, start, kinds, ctx):
+    return div(children='', attrs={'class': 'page-break'}), start + 1
+
+
+def strike(md, line, lo, hi, out, nxt):
+    i = line.find('~~', lo, hi)
+    while i != -1:
+        j = line.find('~~', i + 2, hi)
+        if j == -1:
+            break
+        nxt(line, lo, i, out)
+        children = []
+        nxt(line, i + 2, j, children)
+        out.append(Element('del', children=children))
+        lo = j + 2
+        i = line.find('~~', lo, hi)
+    nxt(line, lo, hi, out)
+
+
+class ExtensionsTestCase(unittest.TestCase):
+
+    def test_remove(self):
+        mdtext = """| a | b |
+| :-: | --: |
+| *x* | y |
+
+$$
+a * b
+$$
+
+cost $*x*$ and `$y$`"""
+        registry = default_extensions()
+        registry.remove('table', 'math')
+        md = Markdown(extensions=registry)
+        self.assertNotIn('table', md.extensions)
+        self.assertIn('table', Markdown().extensions)
+
+        html = md.convert(mdtext)
+        self.assertNotIn('<table', html)
+        self.assertIn('<p>$$a * b$$</p>', html)
+        self.assertIn('<p>cost $<em>x</em>$ and <code>$y$</code></p>', html)
+        self.assertEqual(md.scan(mdtext).inline_formulas, 0)
+        self.assertEqual(Markdown().scan(mdtext).inline_formulas, 1)
+
+    def test_block(self):
+        registry = default_extensions()
+        kind = registry.add_block('note',
+                                  ':',
+                                  note,
+                                  note_open_re,
+                                  layout=FENCE,
+                                  close=note_close_re)
+        registry.add_block('page_break', '*', page_break,
+                           re.compile(r'^\*\*\*$'), priority=20)
+        self.assertEqual(kind, FIRST_KIND)
+        md = Markdown(extensions=registry)
+
+        mdtext = """:::warning
+some *text*
+| not a table |
+:::
+***
+---
+:: plain
+:::open"""
+        self.assertEqual([kinds[0] for _, kinds in md.split_blocks(
+            mdtext.split('\n'))], [kind, FIRST_KIND + 1, LINE_HR, LINE_TEXT,
+                                   kind])
+        self.assertEqual(
+            md.convert(mdtext),
+            '<div class="warning">some <em>text</em> | not a table |</div>\n'
+            '<div class="page-break"></div>\n'
+            '<hr>\n'
+            '<p>:: plain</p>\n'
+            '<p>:::open</p>')
+
+    def test_inline(self):
+        calls = []
+
+        def counted(md, line, lo, hi, out, nxt):
+            calls.append(line)
+            strike(md, line, lo, hi, out, nxt)
+
+        registry = default_extensions()
+        # Between formulas and emphasis, so emphasis is rendered inside it.
+        registry.add_inline('strike', '~', counted, priority=55)
+        md = Markdown(extensions=registry)
+
+        self.assertEqual(
+            md.convert('~~a *b* **c**~~ d\n\nplain `~~x~~` text'),
+            '<p><del>a <em>b</em> <strong>c</strong></del> d</p>\n'
+            '<p>plain <code>~~x~~</code> text</p>')
+        # Code spans are taken out first, then the parts around them.
+        self.assertEqual(calls, ['~~a *b* **c**~~ d'] +
+                         ['plain `~~x~~` text'] * 2)
+
+        md.convert('no tildes *here*')
+        self.assertEqual(len(calls), 3)
+
+    def test_registry(self):
+        registry = default_extensions()
+        self.assertEqual(registry, default_extensions())
+        self.assertEqual(pickle.loads(pickle.dumps(registry)), registry)
+
+        with self.assertRaises(ValueError):
+            registry.add_block('hr', '=', page_break)
+        with self.assertRaises(ValueError):
+            registry.add_block('fence', '=', page_break, layout=FENCE)
+        with self.assertRaises(ValueError):
+            registry.add_block('line', '=', page_break, layout='box')
+        with self.assertRaises(ValueError):
+            registry.add_block('line', ['=='], page_break, layout=LINE)
+        with self.assertRaises(ValueError):
+            registry.add_inline('strike', '', strike)
+        with self.assertRaises(KeyError):
+            registry.remove('strike')
+
+        copy = registry.copy()
+        copy.remove('math')
+        self.assertIn('math', registry)
+        self.assertNotEqual(copy, registry)
+        self.assertEqual(Markdown(extensions=Registry()).convert('# *a*'),
+                         '<p># *a*</p>')
+
+    def test_subclass_overrides(self):
+
+        class Custom(Markdown):
+
+            def hr(self, lines, start, kinds, ctx):
+                return div(children='', attrs={'class': 'rule'}), start + 1
+
+            def _em(self, line, lo, hi, out, nxt):
+                out.append(line[lo:hi].replace('*', '_'))
+
+        md = Custom()
+        self.assertEqual(md.convert('---\n\n*a*'),
+                         '<div class="rule"></div>\n<p>_a_</p>')
+        self.assertEqual(Markdown().convert('---\n\n*a*'),
+                         '<hr>\n<p><em>a</em></p>')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,7 +10,7 @@ from new_markdown.core import Markdown
 
 
 class MarkdownImgTestCase(unittest.TestCase):
-    N_SAMPLES = 1
+    N_SAMPLES = 2
 
     def setUp(self) -> None:
         self.md = Markdown()
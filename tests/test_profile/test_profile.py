@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import unittest
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from new_markdown.core import Markdown
+from new_markdown.profile import Profiler
+
+
+class ProfileTestCase(unittest.TestCase):
+
+    def test_profile(self):
+        mdtext = """
+# Title
+Some *text* with `code` and a [link](example.com)
+
+> quoted **text**
+
+| a | b |
+| :-: | --: |
+| $x | y$ | *z* |
+"""
+        profiler = Profiler()
+        md = Markdown(recording_headers=True,
+                      header_ids='slug',
+                      profiler=profiler)
+        html = md.convert(mdtext, final=True)
+        self.assertEqual(
+            html,
+            Markdown(recording_headers=True,
+                     header_ids='slug').convert(mdtext, final=True))
+
+        stats = profiler.stats
+        for name in ('header', 'p', 'blockquote', 'table', 'inline:code',
+                     'inline:em', 'inline:a'):
+            self.assertIn(name, stats)
+        self.assertEqual(stats['header'].calls, 1)
+        self.assertEqual(stats['blockquote'].bytes,
+                         len('<blockquote class="blockquote"><p>quoted '
+                             '<strong>text</strong></p></blockquote>'))
+        self.assertGreaterEqual(stats['blockquote'].seconds,
+                                stats['blockquote'].self_seconds)
+        self.assertIn('inline:em', profiler.report())
+
+    def test_streamed_table(self):
+        rows = '\n'.join(f'| **{i}** | x |' for i in range(10))
+        mdtext = f'| a | b |\n| :-: | --: |\n{rows}'
+        profiler = Profiler()
+        md = Markdown(profiler=profiler)
+        html = md.convert(mdtext)
+        self.assertEqual(html, Markdown().convert(mdtext))
+
+        # Rows are rendered once, when the document is, and charged to table.
+        stats = profiler.stats
+        self.assertEqual(stats['inline:strong'].calls, 10)
+        self.assertEqual(stats['table'].calls, 1)
+        self.assertGreaterEqual(stats['table'].self_seconds, 0)
+        self.assertGreater(stats['table'].bytes,
+                           len('<tr><td></td><td></td></tr>') * 10)
+
+    def test_disabled(self):
+        md = Markdown()
+        self.assertNotIn('_code', vars(md))
+        self.assertEqual(md._handlers, md.block_handlers())
+
+
+if __name__ == '__main__':
+    unittest.main()
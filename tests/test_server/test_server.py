@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import json
+import sys
+import os
+import threading
+import unittest
+from http.client import HTTPConnection
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from new_markdown.core import Markdown
+from new_markdown.server import RenderServer
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def serve(self, workers):
+        server = RenderServer(('127.0.0.1', 0), workers=workers)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.addCleanup(stop)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    def post(self, url, body):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        with urlopen(Request(f'{url}/render', data=data), timeout=10) as resp:
+            return resp.read().decode('utf-8'), resp.headers['X-Cache']
+
+    def test_render(self):
+        url = self.serve(workers=0)
+        mdtext = '# Title\n## Sub\nSome *text* and $a_1$'
+        md = Markdown(recording_headers=True,
+                      directory_title='Contents',
+                      header_ids='slug')
+        request = {
+            'text': mdtext,
+            'final': True,
+            'recording_headers': True,
+            'directory_title': 'Contents',
+            'header_ids': 'slug',
+        }
+        self.assertEqual(self.post(url, request),
+                         (md.convert(mdtext, final=True), 'miss'))
+        self.assertEqual(self.post(url, request),
+                         (md.convert(mdtext, final=True), 'hit'))
+        self.assertEqual(self.post(url, {'text': mdtext}),
+                         (Markdown().convert(mdtext), 'miss'))
+
+        for body, status in ((b'{', 400), ({'text': 1}, 400),
+                             ({'text': '', 'header_ids': 'x'}, 400)):
+            with self.assertRaises(HTTPError) as cm:
+                self.post(url, body)
+            self.assertEqual(cm.exception.code, status)
+        with self.assertRaises(HTTPError) as cm:
+            urlopen(f'{url}/missing', timeout=10)
+        self.assertEqual(cm.exception.code, 404)
+
+        with urlopen(f'{url}/stats', timeout=10) as resp:
+            stats = json.loads(resp.read())
+        self.assertEqual((stats['requests'], stats['errors']), (6, 3))
+        self.assertEqual((stats['cache']['hits'], stats['cache']['entries']),
+                         (1, 2))
+        latency = stats['latency_ms']
+        self.assertLessEqual(latency['p50'], latency['p99'])
+        self.assertLessEqual(latency['p99'], latency['max'])
+
+    def test_content_length(self):
+        url = self.serve(workers=0)
+        host, port = url[len('http://'):].split(':')
+        for length, status in ((None, 411), ('abc', 400), ('-1', 400),
+                               ('2', 400)):
+            conn = HTTPConnection(host, int(port), timeout=10)
+            self.addCleanup(conn.close)
+            conn.putrequest('POST', '/render')
+            if length is not None:
+                conn.putheader('Content-Length', length)
+            conn.endheaders(b'{}')
+            self.assertEqual(conn.getresponse().status, status)
+
+        with urlopen(f'{url}/stats', timeout=10) as resp:
+            stats = json.loads(resp.read())
+        self.assertEqual((stats['requests'], stats['errors']), (4, 4))
+
+    def test_workers(self):
+        url = self.serve(workers=1)
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda i=i: results.append(
+                    self.post(url, {'text': f'**{i}**'})[0]))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results),
+                         sorted(f'<p><strong>{i}</strong></p>'
+                                for i in range(8)))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import os
+import tempfile
+import unittest
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from new_markdown import batch
+from new_markdown.watch import Watcher
+
+
+class WatchTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        for name in ('a.md', 'b.md'):
+            self.write(name, f'# {name}\n')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        return super().tearDown()
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as fout:
+            fout.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_watch(self):
+        converted = []
+
+        def convert(job):
+            converted.append(os.path.basename(job.input))
+            return batch.convert_job(job)
+
+        watcher = Watcher(lambda: batch.collect_jobs([self.root]),
+                          convert,
+                          debounce=0.5)
+        self.assertIsNone(watcher.poll(0.0))
+        rebuild = watcher.poll(0.5)
+        self.assertEqual(sorted(converted), ['a.md', 'b.md'])
+        self.assertFalse(any(result.error for result in rebuild.results))
+        self.assertGreaterEqual(rebuild.latency, 0.5)
+        self.assertIsNone(watcher.poll(1.0))
+
+        # A burst of saves is rebuilt once, after it has settled.
+        converted.clear()
+        for i, now in enumerate((2.0, 2.2, 2.4)):
+            self.write('a.md', f'# a {i}\n', mtime=1000 + i)
+            self.assertIsNone(watcher.poll(now))
+        self.write('c.md', '# c\n')
+        self.assertIsNone(watcher.poll(2.6))
+        rebuild = watcher.poll(3.1)
+        self.assertEqual(sorted(converted), ['a.md', 'c.md'])
+        self.assertAlmostEqual(rebuild.latency, 1.1 + rebuild.seconds)
+        with open(os.path.join(self.root, 'a.html')) as fin:
+            self.assertIn('a 2', fin.read())
+        self.assertIsNone(watcher.poll(4.0))